@@ -0,0 +1,158 @@
+"""
+    This module provides the clocks used to simulate the datastore delays:
+    the real clock, which sleeps for the requested time, and a virtual clock,
+    which only advances a simulated time, allowing long tests to run without
+    waiting for the delays.
+
+    Computer Systems Architecture Course
+    Assignment 1 - Cluster Activity Simulation
+    March 2014
+"""
+
+
+from heapq import heappop, heappush
+from threading import Condition, Event, Thread
+import time
+
+
+class RealClock:
+    """
+        Clock that measures and waits for real (wall-clock) time.
+    """
+
+    def now(self):
+        """
+            Returns the current time.
+
+            @rtype: Float
+            @return: the current time, in seconds
+        """
+        return time.time()
+
+
+    def sleep(self, delay):
+        """
+            Blocks the calling thread for the given time.
+
+            @type delay: Float
+            @param delay: the time to wait, in seconds
+        """
+        time.sleep(delay)
+
+
+class VirtualClock:
+    """
+        Discrete-event clock. Sleeping threads are queued by their wake-up
+        time and a scheduler thread advances the simulated time directly to
+        the earliest wake-up once, for a short real time interval (the
+        quantum), no thread has started sleeping and the process has been
+        almost idle, i.e. once the other threads are either sleeping or
+        blocked waiting for them.
+
+        Time spent computing between two sleeps is not simulated, so the
+        measured makespan only accounts for the datastore delays and their
+        ordering.
+    """
+
+    def __init__(self, quantum=0.005, idle_load=0.2):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Creates a new stopped virtual clock, starting at time 0.
+
+            @type quantum: Float
+            @param quantum: the real time, in seconds, during which no new
+                sleeping thread must appear before the time is advanced
+            @type idle_load: Float
+            @param idle_load: the fraction of the quantum the process may
+                spend running during the quantum and still count as idle
+        """
+        self.quantum = quantum
+        self.idle_load = idle_load
+        self.time = 0.0
+        self.sleepers = []
+        self.sequence = 0
+        self.activity = 0
+        self.running = False
+        self.condition = Condition()
+        self.thread = None
+
+
+    def now(self):
+        """
+            Returns the current simulated time.
+
+            @rtype: Float
+            @return: the simulated time, in seconds
+        """
+        return self.time
+
+
+    def sleep(self, delay):
+        """
+            Blocks the calling thread until the simulated time advances by the
+            given delay.
+
+            @type delay: Float
+            @param delay: the simulated time to wait, in seconds
+        """
+        woken = Event()
+        with self.condition:
+            heappush(self.sleepers, (self.time + delay, self.sequence, woken))
+            self.sequence += 1
+            self.activity += 1
+            self.condition.notify()
+        woken.wait()
+
+
+    def start(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Starts the scheduler thread.
+        """
+        self.running = True
+        self.thread = Thread(target=self.__run)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def stop(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Stops the scheduler thread, waking up any remaining sleepers.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+        for (wake, sequence, woken) in self.sleepers:
+            woken.set()
+        self.sleepers = []
+
+
+    def __run(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Body of the scheduler thread.
+        """
+        with self.condition:
+            while self.running:
+                if len(self.sleepers) == 0:
+                    self.condition.wait()
+                    continue
+
+                activity = self.activity
+                cpu = time.clock()
+                self.condition.wait(self.quantum)
+                if activity != self.activity or not self.running:
+                    continue
+                if time.clock() - cpu > self.idle_load * self.quantum:
+                    continue
+
+                self.time = max(self.time, self.sleepers[0][0])
+                while len(self.sleepers) > 0 and self.sleepers[0][0] <= self.time:
+                    heappop(self.sleepers)[2].set()
@@ -0,0 +1,193 @@
+"""
+    This module provides collective operations between the cluster's nodes,
+    built on the node message queues: broadcast, reduce, allreduce,
+    allgather and barrier. They use binomial trees, so every participating node sends
+    O(log n) messages and the operation completes in O(log n) rounds.
+
+    All the nodes of a group must call the same operation with the same
+    group, root and step. The step identifies the operation: messages of
+    different operations running at the same time never mix.
+
+    Computer Systems Architecture Course
+    Assignment 1 - Cluster Activity Simulation
+    March 2014
+"""
+
+
+# Message types, distinct from the ones used by the nodes
+BROADCAST = 10
+REDUCE = 11
+
+
+def children(rank, size):
+    """
+        Returns the children of a node in a binomial tree rooted at rank 0,
+        largest subtree first.
+
+        @type rank: Integer
+        @param rank: the rank of the node, relative to the root
+        @type size: Integer
+        @param size: the number of nodes in the tree
+        @rtype: List of Integer
+        @return: the relative ranks of the children
+    """
+    mask = 1
+    while mask <= rank:
+        mask <<= 1
+
+    result = []
+    while rank + mask < size:
+        result.append(rank + mask)
+        mask <<= 1
+    result.reverse()
+    return result
+
+
+def parent(rank):
+    """
+        Returns the parent of a node in a binomial tree rooted at rank 0.
+
+        @type rank: Integer
+        @param rank: the rank of the node, relative to the root; not 0
+        @rtype: Integer
+        @return: the relative rank of the parent
+    """
+    mask = 1
+    while mask <= rank:
+        mask <<= 1
+    return rank - (mask >> 1)
+
+
+def broadcast(node, group, root, step, data = None):
+    """
+        Sends data from the root to all the nodes of the group. Every node
+        forwards the data to its children before returning.
+
+        @type node: Node
+        @param node: the calling node, a member of the group
+        @type group: List of Node
+        @param group: the participating nodes
+        @type root: Node
+        @param root: the node owning the data
+        @param step: identifies the operation
+        @param data: the data to send; only used by the root
+        @return: the data sent by the root
+    """
+    size = len(group)
+    offset = group.index(root)
+    rank = (group.index(node) - offset) % size
+
+    if rank != 0:
+        data = node.receive((BROADCAST,), step).data
+    for child in children(rank, size):
+        node.send(group[(child + offset) % size], BROADCAST, step, data)
+    return data
+
+
+def reduce(node, group, root, step, value, op, idle = None):
+    """
+        Combines the values of all the nodes of the group with the given
+        operator. The operator must be associative and commutative, since the
+        values are combined in the order in which they arrive.
+
+        @type node: Node
+        @param node: the calling node, a member of the group
+        @type group: List of Node
+        @param group: the participating nodes
+        @type root: Node
+        @param root: the node receiving the result
+        @param step: identifies the operation
+        @param value: the value of the calling node
+        @type op: Function
+        @param op: combines two values into one
+        @type idle: Function
+        @param idle: called without arguments on the nodes other than the
+            root, once their value is sent, to do some work while the other
+            nodes finish
+        @return: the combined value on the root, None on the other nodes
+    """
+    size = len(group)
+    offset = group.index(root)
+    rank = (group.index(node) - offset) % size
+
+    for child in children(rank, size):
+        value = op(value, node.receive((REDUCE,), step).data)
+    if rank == 0:
+        return value
+
+    node.send(group[(parent(rank) + offset) % size], REDUCE, step, value)
+    if idle is not None:
+        idle()
+    return None
+
+
+def allreduce(node, group, step, value, op, idle = None):
+    """
+        Combines the values of all the nodes of the group with the given
+        operator and returns the result to all of them.
+
+        @type node: Node
+        @param node: the calling node, a member of the group
+        @type group: List of Node
+        @param group: the participating nodes
+        @param step: identifies the operation
+        @param value: the value of the calling node
+        @type op: Function
+        @param op: combines two values into one, see reduce()
+        @type idle: Function
+        @param idle: work to do while waiting for the result, see reduce()
+        @return: the combined value
+    """
+    value = reduce(node, group, group[0], step, value, op, idle)
+    return broadcast(node, group, group[0], step, value)
+
+
+def allgather(node, group, step, value, index = None):
+    """
+        Collects the values of all the nodes of the group on all of them.
+
+        @type node: Node
+        @param node: the calling node, a member of the group
+        @type group: List of Node
+        @param group: the participating nodes
+        @param step: identifies the operation
+        @param value: the value of the calling node
+        @type index: Integer
+        @param index: the position of the value in the result; the position
+            of the node in the group if not given. The positions of the
+            nodes must be distinct and less than the size of the group.
+        @rtype: List
+        @return: the values of all the nodes, by position
+    """
+    if index is None:
+        index = group.index(node)
+    pairs = allreduce(node, group, step, [(index, value)], lambda a, b: a + b)
+
+    result = [None] * len(group)
+    for (index, value) in pairs:
+        result[index] = value
+    return result
+
+
+def barrier(node, group, step):
+    """
+        Blocks until all the nodes of the group call barrier().
+
+        @type node: Node
+        @param node: the calling node, a member of the group
+        @type group: List of Node
+        @param group: the participating nodes
+        @param step: identifies the operation
+    """
+    allreduce(node, group, step, None, lambda a, b: None)
+
+
+def argmax(a, b):
+    """
+        Reduction operator choosing the value with the highest score. Values
+        are tuples starting with the score and an index; on equal scores the
+        lowest index wins, so the result does not depend on arrival order.
+    """
+    if b[0] > a[0] or (b[0] == a[0] and b[1] < a[1]):
+        return b
+    return a
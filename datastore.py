@@ -7,9 +7,293 @@
 """
 
 
-from random import Random
-from threading import current_thread, Semaphore
-from time import sleep
+from collections import deque
+from heapq import heappop, heappush
+from threading import current_thread, Condition, Event, Lock, Semaphore, Thread
+
+from clock import RealClock
+from kernels import densify, sparsify
+from latency import UniformLatency
+from util import percentile
+
+
+# What happens to a request exceeding the maximum number of in-flight requests
+ADMISSION_REPORT = "report"      # reported as an error, then served anyway
+ADMISSION_FIFO = "fifo"          # waits for a free slot, in arrival order
+ADMISSION_PRIORITY = "priority"  # waits for a free slot, lowest priority first
+
+
+class Future:
+    """
+        Class that represents the pending result of an asynchronous datastore
+        request.
+    """
+
+    def __init__(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Creates a new, not yet completed, future.
+        """
+        self.finished = Event()
+        self.value = None
+        self.error = None
+        self.callbacks = []
+        self.callbacks_lock = Lock()
+
+
+    def done(self):
+        """
+            Checks whether the request has completed.
+
+            @rtype: Boolean
+            @return: True, if the result is available; False otherwise
+        """
+        return self.finished.is_set()
+
+
+    def result(self, timeout=None):
+        """
+            Returns the result of the request, blocking until it is available.
+
+            @type timeout: Float
+            @param timeout: the maximum time to wait, None to wait forever
+
+            @rtype: Object
+            @return: the value returned by the request (None for updates)
+        """
+        if not self.finished.wait(timeout):
+            raise RuntimeError("datastore request did not complete in time")
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+    def add_done_callback(self, callback):
+        """
+            Registers a function to be called with this future as argument
+            when the request completes. The function is called from the
+            datastore thread completing the request, or immediately if the
+            request has already completed.
+
+            @type callback: Function
+            @param callback: the function to call
+        """
+        with self.callbacks_lock:
+            if not self.finished.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+
+    def set_result(self, value, error=None):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Completes the request with the given value or error.
+
+            @type value: Object
+            @param value: the value returned by the request
+            @type error: Exception
+            @param error: the error raised by the request, if any
+        """
+        with self.callbacks_lock:
+            self.value = value
+            self.error = error
+            self.finished.set()
+            callbacks = self.callbacks
+            self.callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+
+def nonzeros(row, start, stop):
+    """
+        Returns the nonzero elements of a row between two columns; rows
+        storing their nonzero elements, like SparseRow, are not scanned.
+
+        @type row: List of Float, RowView or SparseRow
+        @param row: the row
+        @type start: Integer
+        @param start: the first column
+        @type stop: Integer
+        @param stop: the column after the last one
+        @rtype: (List of Integer, List of Float)
+        @return: the columns and the values of the elements
+    """
+    if hasattr(row, "nonzeros"):
+        return row.nonzeros(start, stop)
+    return sparsify(row[start:stop], start)
+
+
+def set_nonzeros(row, start, stop, indices, values):
+    """
+        Replaces the elements of a row between two columns with the given
+        nonzero elements, see nonzeros().
+    """
+    if hasattr(row, "set_nonzeros"):
+        row.set_nonzeros(start, stop, indices, values)
+    else:
+        row[start:stop] = densify((indices, values), stop - start, start)
+
+
+def width(b):
+    """
+        Returns the number of right-hand sides of an element of b, a Float or
+        a Vector holding one element per right-hand side.
+    """
+    if hasattr(b, "__len__"):
+        return len(b)
+    return 1
+
+
+def wait_all(futures):
+    """
+        Blocks until all the given requests complete.
+
+        @type futures: List of Future
+        @param futures: the requests to wait for
+
+        @rtype: List of Object
+        @return: the results of the requests, in the same order
+    """
+    return [future.result() for future in futures]
+
+
+class DatastoreStats:
+    """
+        Class that holds the performance counters of a datastore.
+    """
+
+    def __init__(self, max_pending_requests):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Creates new, empty, counters.
+
+            @type max_pending_requests: Integer
+            @param max_pending_requests: the in-flight limit of the datastore
+        """
+        self.lock = Lock()
+        self.max_pending_requests = max_pending_requests
+        self.service_times = {}
+        self.in_flight = 0
+        self.in_flight_max = 0
+        self.rejected = 0
+        self.queued = 0
+        self.queue_wait_time = 0.0
+        self.queue_depth_max = 0
+
+
+    def start_request(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Records the start of the service of a request.
+        """
+        with self.lock:
+            self.in_flight += 1
+            self.in_flight_max = max(self.in_flight_max, self.in_flight)
+
+
+    def end_request(self, operation, service_time):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Records the end of the service of a request.
+
+            @type operation: String
+            @param operation: the name of the datastore method
+            @type service_time: Float
+            @param service_time: the time taken to serve the request
+        """
+        with self.lock:
+            self.in_flight -= 1
+            self.service_times.setdefault(operation, []).append(service_time)
+
+
+    def reject_request(self, operation):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Records a request over the in-flight limit, which is only reported.
+
+            @type operation: String
+            @param operation: the name of the datastore method
+        """
+        with self.lock:
+            self.rejected += 1
+            self.service_times.setdefault(operation, []).append(0.0)
+
+
+    def queue_request(self, wait_time, depth):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Records a request which waited for a free in-flight slot.
+
+            @type wait_time: Float
+            @param wait_time: the time spent waiting
+            @type depth: Integer
+            @param depth: the length of the queue when the request joined it
+        """
+        with self.lock:
+            self.queued += 1
+            self.queue_wait_time += wait_time
+            self.queue_depth_max = max(self.queue_depth_max, depth)
+
+
+    def merge(self, other):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Adds the counters of another datastore to these counters.
+
+            @type other: DatastoreStats
+            @param other: the counters to add
+        """
+        with other.lock:
+            for operation, times in other.service_times.items():
+                self.service_times.setdefault(operation, []).extend(times)
+            self.max_pending_requests = max(self.max_pending_requests,
+                other.max_pending_requests)
+            self.in_flight_max = max(self.in_flight_max, other.in_flight_max)
+            self.rejected += other.rejected
+            self.queued += other.queued
+            self.queue_wait_time += other.queue_wait_time
+            self.queue_depth_max = max(self.queue_depth_max,
+                other.queue_depth_max)
+
+
+    def summary(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Returns the counters, with the service times of each operation
+            summarized as number of calls, total time and percentiles.
+
+            @rtype: Dictionary
+            @return: the counters, ready to be written as JSON
+        """
+        with self.lock:
+            operations = {}
+            for operation, times in self.service_times.items():
+                times = sorted(times)
+                operations[operation] = {
+                    "calls": len(times),
+                    "total_time": sum(times),
+                    "p50": percentile(times, 50),
+                    "p90": percentile(times, 90),
+                    "p99": percentile(times, 99),
+                    "max": times[-1]}
+
+            return {"operations": operations,
+                    "max_pending_requests": self.max_pending_requests,
+                    "in_flight_max": self.in_flight_max,
+                    "rejected": self.rejected,
+                    "queued": self.queued,
+                    "queue_wait_time": self.queue_wait_time,
+                    "queue_depth_max": self.queue_depth_max}
 
 
 class Datastore:
@@ -18,16 +302,18 @@ class Datastore:
     """
 
     def __init__(self, A_row, b_elem, max_pending_requests, delay_min, delay_max,
-        delay_seed, supervisor):
+        delay_seed, supervisor, transfer_delay=0, clock=None,
+        latency_model=None, admission=ADMISSION_REPORT):
         """
             !!! This is not part of the assignment API, do not call it !!!
 
             Instantiates a new datastore with the given stored data and parameters.
 
-            @type A_row: List of Float
-            @param A_row: the row from matrix A
-            @type b_elem: Float
-            @param b_elem: the element from vector b
+            @type A_row: List of Float or RowView
+            @param A_row: the row from matrix A; slices of it must be lists
+            @type b_elem: Float or Vector
+            @param b_elem: the element from vector b; a Vector holding one
+                element per right-hand side if there are several
             @type max_pending_requests: Integer
             @param max_pending_requests: number of request to allow in-flight
             @type delay_min: Float
@@ -38,41 +324,282 @@ class Datastore:
             @param delay_seed: seed used to randomly generate delays
             @type supervisor: Supervisor
             @param supervisor: supervisor to use for checking accesses
+            @type transfer_delay: Float
+            @param transfer_delay: the extra time taken by a request for each
+                transferred element after the first one
+            @type clock: RealClock or VirtualClock
+            @param clock: the clock used to wait for the delays; the real clock
+                if not given
+            @type latency_model: LatencyModel
+            @param latency_model: the model giving the time taken by each
+                request; if not given, delays are uniformly distributed between
+                'delay_min' and 'delay_max' (plus the transfer delay)
+            @type admission: String
+            @param admission: what happens to requests exceeding the maximum
+                number of in-flight requests: ADMISSION_REPORT,
+                ADMISSION_FIFO or ADMISSION_PRIORITY
         """
         self.A_row = A_row
         self.b_elem = b_elem
         self.max_pending_requests = max_pending_requests
         self.delay_min = delay_min
         self.delay_max = delay_max
+        self.transfer_delay = transfer_delay
         self.supervisor = supervisor
+        self.clock = clock if clock is not None else RealClock()
         self.remaining_requests = Semaphore(max_pending_requests)
-        self.random = Random(delay_seed)
+        if latency_model is None:
+            latency_model = UniformLatency(delay_min, delay_max, delay_seed,
+                transfer_delay)
+        self.latency_model = latency_model
+        self.admission = admission
+        self.admission_condition = Condition()
+        self.admission_queue = []
+        self.admission_sequence = 0
+        self.in_flight = 0
+        self.stats = DatastoreStats(max_pending_requests)
+        self.submitted = deque()
+        self.workers = 0
+        self.workers_lock = Lock()
 
 
-    def __check_request(self, node):
+    def __check_request(self, node, operation, count=1, priority=0,
+        read=None):
         """
             !!! This is not part of the assignment API, do not call it !!!
 
             Internal datastore method used to check if a request is valid.
+            A request moving several elements is checked once and occupies a
+            single in-flight slot; its delay grows with the number of elements.
 
             @type node: Node
             @param node: the node wanting to access the datastore
+            @type operation: String
+            @param operation: the name of the datastore method
+            @type count: Integer
+            @param count: the number of elements transferred by the request
+            @type priority: Integer
+            @param priority: the priority of the request in ADMISSION_PRIORITY
+                mode; lower values are served first
+            @type read: Function
+            @param read: for reads whose size depends on the data, see
+                __serve_request
+
+            @return: the result of 'read', if given
         """
         self.supervisor.check_access(self, node, current_thread())
+        return self.__serve_request(node, operation, count, priority, read)
+
 
-        if self.max_pending_requests != 0:
+    def __serve_request(self, node, operation, count, priority, read=None):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Internal datastore method that takes an in-flight slot and waits
+            for the time taken by an already checked request.
+
+            @type node: Node
+            @param node: the node accessing the datastore
+            @type operation: String
+            @param operation: the name of the datastore method
+            @type count: Integer
+            @param count: the number of elements transferred by the request
+            @type priority: Integer
+            @param priority: the priority of the request in ADMISSION_PRIORITY
+                mode; lower values are served first
+            @type read: Function
+            @param read: for reads whose size depends on the data; called
+                once the request is admitted, returns the result and the
+                number of transferred elements, which replaces 'count'
+
+            @return: the result of 'read', if given
+        """
+        value = None
+        queued = self.max_pending_requests != 0 and \
+            self.admission != ADMISSION_REPORT
+
+        if queued:
+            self.__admit(priority)
+        elif self.max_pending_requests != 0:
             if not self.remaining_requests.acquire(False):
                 #ERROR: no more remaining requests
                 self.supervisor.report("maximum pending datastore requests \
     exceeded on node " + str(node))
-                return
+                self.stats.reject_request(operation)
+                if read is not None:
+                    (value, count) = read()
+                return value
 
-        delay = self.delay_min + (self.delay_max - self.delay_min) * self.random.random()
+        self.stats.start_request()
+        if read is not None:
+            (value, count) = read()
+        delay = self.latency_model.delay(count,
+            "%s:%s:%d" % (node, operation, count))
         if delay > 0:
-            sleep(delay)
+            self.clock.sleep(delay)
+        self.stats.end_request(operation, delay)
 
-        if self.max_pending_requests != 0:
+        if queued:
+            with self.admission_condition:
+                self.in_flight -= 1
+                self.admission_condition.notify_all()
+        elif self.max_pending_requests != 0:
             self.remaining_requests.release()
+        return value
+
+
+    def __admit(self, priority):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Internal datastore method that blocks the request until one of the
+            in-flight slots is free and all the requests queued before it (or,
+            in ADMISSION_PRIORITY mode, with a lower priority) were admitted.
+
+            @type priority: Integer
+            @param priority: the priority of the request
+        """
+        with self.admission_condition:
+            if self.in_flight < self.max_pending_requests and \
+                    len(self.admission_queue) == 0:
+                self.in_flight += 1
+                return
+
+            if self.admission != ADMISSION_PRIORITY:
+                priority = 0
+            ticket = (priority, self.admission_sequence)
+            self.admission_sequence += 1
+            heappush(self.admission_queue, ticket)
+            depth = len(self.admission_queue)
+            start = self.clock.now()
+
+            while self.in_flight >= self.max_pending_requests or \
+                    self.admission_queue[0] != ticket:
+                self.admission_condition.wait()
+
+            heappop(self.admission_queue)
+            self.in_flight += 1
+            self.admission_condition.notify_all()
+
+        self.stats.queue_request(self.clock.now() - start, depth)
+
+
+    def __submit(self, node, operation, count, priority, action, read=None):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Internal datastore method used to queue an asynchronous request.
+            The access is checked in the calling thread; the request is then
+            served by one of at most get_max_pending_requests() datastore
+            threads. Requests in flight at the same time may complete in any
+            order.
+
+            @type node: Node
+            @param node: the node wanting to access the datastore
+            @type operation: String
+            @param operation: the name of the datastore method
+            @type count: Integer
+            @param count: the number of elements transferred by the request
+            @type priority: Integer
+            @param priority: the priority of the request
+            @type action: Function
+            @param action: performs the request and returns its result; None
+                if 'read' gives the result
+            @type read: Function
+            @param read: for reads whose size depends on the data, see
+                __serve_request
+
+            @rtype: Future
+            @return: the pending result of the request
+        """
+        self.supervisor.check_access(self, node, current_thread())
+
+        future = Future()
+        with self.workers_lock:
+            self.submitted.append((node, operation, count, priority, action,
+                read, future))
+            if self.max_pending_requests != 0 and \
+                    self.workers >= self.max_pending_requests:
+                return future
+            self.workers += 1
+
+        worker = Thread(target=self.__worker)
+        worker.daemon = True
+        self.supervisor.register_datastore_thread(worker)
+        worker.start()
+
+        return future
+
+
+    def __worker(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Body of the datastore threads: serves queued requests and exits as
+            soon as there are none left.
+        """
+        while True:
+            with self.workers_lock:
+                if len(self.submitted) == 0:
+                    self.workers -= 1
+                    return
+                (node, operation, count, priority, action, read, future) = \
+                    self.submitted.popleft()
+
+            value = self.__serve_request(node, operation, count, priority,
+                read)
+            if action is None:
+                future.set_result(value)
+                continue
+            try:
+                value = action()
+            except Exception, err:
+                future.set_result(None, err)
+            else:
+                future.set_result(value)
+
+
+    def __read_sparse_row(self, start, stop):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Reads the nonzero elements of the A row between two columns and
+            the element of b, for get_sparse_row().
+
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+
+            @rtype: (((List of Integer, List of Float), Float), Integer)
+            @return: the result of get_sparse_row() and the number of
+                transferred elements
+        """
+        row = nonzeros(self.A_row, start, stop)
+        return ((row, self.b_elem), len(row[0]) + width(self.b_elem))
+
+
+    def get_stats(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Returns the performance counters of this datastore.
+
+            @rtype: DatastoreStats
+            @return: the counters
+        """
+        return self.stats
+
+
+    def get_time(self):
+        """
+            Returns the current time of the clock used for the request delays;
+            in tests using virtual time, this is the simulated time.
+
+            @rtype: Float
+            @return: the current time, in seconds
+        """
+        return self.clock.now()
 
 
     def register_thread(self, node, thread):
@@ -103,7 +630,7 @@ class Datastore:
         return self.max_pending_requests
 
 
-    def get_A(self, node, column):
+    def get_A(self, node, column, priority=0):
         """
             Returns an element from the row of the A matrix that is stored in
             this datastore. This is a blocking operation. The maximum number of
@@ -114,16 +641,20 @@ class Datastore:
                 owns the datastore
             @type column: Integer
             @param column: the column of the element
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
 
             @rtype: Float
             @return: the element of matrix A at the requested position
         """
-        self.__check_request(node)
+        self.__check_request(node, "get_A", priority=priority)
 
         return self.A_row[column]
 
 
-    def put_A(self, node, column, A):
+    def put_A(self, node, column, A, priority=0):
         """
             Updates an element from the row of the A matrix that is stored in
             this datastore. This is a blocking operation. The maximum number of
@@ -136,13 +667,17 @@ class Datastore:
             @param column: the column of the element
             @type A: Float
             @param A: the new element value
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
         """
-        self.__check_request(node)
+        self.__check_request(node, "put_A", priority=priority)
 
         self.A_row[column] = A
 
 
-    def get_b(self, node):
+    def get_b(self, node, priority=0):
         """
             Returns the element of b stored in this datastore. This is a
             blocking operation. The maximum number of in-flight requests is 
@@ -151,15 +686,19 @@ class Datastore:
             @type node: Node
             @param node: the node accessing the datastore; must be the node that
                 owns the datastore
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
 
-            @rtype: Float
+            @rtype: Float or Vector
             @return: the element of b stored in this datastore
         """
-        self.__check_request(node)
+        self.__check_request(node, "get_b", width(self.b_elem), priority)
 
         return self.b_elem
 
-    def put_b(self, node, b):
+    def put_b(self, node, b, priority=0):
         """
             Updates the element of b stored in this datastore. This is a
             blocking operation. The maximum number of in-flight requests is 
@@ -168,9 +707,435 @@ class Datastore:
             @type node: Node
             @param node: the node accessing the datastore; must be the node that
                 owns the datastore
+            @type b: Float or Vector
+            @param b: the new value of b
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+        """
+        self.__check_request(node, "put_b", width(b), priority)
+
+        self.b_elem = b
+
+
+    def get_A_range(self, node, start, stop, priority=0):
+        """
+            Returns the elements from the row of the A matrix stored in this
+            datastore, between the columns 'start' (inclusive) and 'stop'
+            (exclusive). This is a blocking operation counting as a single
+            in-flight request, see get_max_pending_requests().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: List of Float
+            @return: the elements of matrix A at the requested positions
+        """
+        self.__check_request(node, "get_A_range", stop - start, priority)
+
+        return self.A_row[start:stop]
+
+
+    def put_A_range(self, node, start, values, priority=0):
+        """
+            Updates consecutive elements from the row of the A matrix stored in
+            this datastore, starting with column 'start'. This is a blocking
+            operation counting as a single in-flight request, see
+            get_max_pending_requests().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the column of the first element
+            @type values: List of Float
+            @param values: the new element values
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+        """
+        self.__check_request(node, "put_A_range", len(values), priority)
+
+        self.A_row[start:start + len(values)] = values
+
+
+    def get_row(self, node, start, stop, priority=0):
+        """
+            Returns the elements of the A row between the columns 'start'
+            (inclusive) and 'stop' (exclusive) together with the element of b.
+            This is a blocking operation counting as a single in-flight
+            request, see get_max_pending_requests().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: (List of Float, Float)
+            @return: the elements of matrix A at the requested positions and
+                the element of b
+        """
+        self.__check_request(node, "get_row",
+            stop - start + width(self.b_elem), priority)
+
+        return (self.A_row[start:stop], self.b_elem)
+
+
+    def put_row(self, node, start, values, b, priority=0):
+        """
+            Updates consecutive elements of the A row, starting with column
+            'start', together with the element of b. This is a blocking
+            operation counting as a single in-flight request, see
+            get_max_pending_requests().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the column of the first element
+            @type values: List of Float
+            @param values: the new element values
             @type b: Float
             @param b: the new value of b
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
         """
-        self.__check_request(node)
+        self.__check_request(node, "put_row", len(values) + width(b),
+            priority)
 
+        self.A_row[start:start + len(values)] = values
         self.b_elem = b
+
+
+    def get_sparse_row(self, node, start, stop, priority=0):
+        """
+            Returns the nonzero elements of the A row between the columns
+            'start' (inclusive) and 'stop' (exclusive) together with the
+            element of b. The delay grows with the number of nonzero elements
+            instead of the number of columns. This is a blocking operation
+            counting as a single in-flight request, see
+            get_max_pending_requests().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: ((List of Integer, List of Float), Float)
+            @return: the columns and the values of the nonzero elements, and
+                the element of b
+        """
+        return self.__check_request(node, "get_sparse_row", None, priority,
+            lambda: self.__read_sparse_row(start, stop))
+
+
+    def put_sparse_row(self, node, start, stop, indices, values, b=None,
+        priority=0):
+        """
+            Replaces the elements of the A row between the columns 'start'
+            (inclusive) and 'stop' (exclusive) with the given nonzero
+            elements, and optionally the element of b. The delay grows with
+            the number of nonzero elements. This is a blocking operation
+            counting as a single in-flight request, see
+            get_max_pending_requests().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type indices: List of Integer
+            @param indices: the columns of the nonzero elements, increasing
+            @type values: List of Float
+            @param values: the nonzero elements
+            @type b: Float
+            @param b: the new value of b; None to keep it
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+        """
+        self.__check_request(node, "put_sparse_row",
+            len(values) + (width(b) if b is not None else 0), priority)
+
+        set_nonzeros(self.A_row, start, stop, indices, values)
+        if b is not None:
+            self.b_elem = b
+
+
+    def submit_get_A(self, node, column, priority=0):
+        """
+            Asynchronous version of get_A(). Returns immediately; the request
+            counts as in-flight until the returned future completes.
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type column: Integer
+            @param column: the column of the element
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: the pending element of matrix A
+        """
+        return self.__submit(node, "get_A", 1, priority,
+            lambda: self.A_row[column])
+
+
+    def submit_put_A(self, node, column, A, priority=0):
+        """
+            Asynchronous version of put_A().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type column: Integer
+            @param column: the column of the element
+            @type A: Float
+            @param A: the new element value
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: completes when the element is updated
+        """
+        def action():
+            self.A_row[column] = A
+        return self.__submit(node, "put_A", 1, priority, action)
+
+
+    def submit_get_b(self, node, priority=0):
+        """
+            Asynchronous version of get_b().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: the pending element of b
+        """
+        return self.__submit(node, "get_b", width(self.b_elem), priority,
+            lambda: self.b_elem)
+
+
+    def submit_put_b(self, node, b, priority=0):
+        """
+            Asynchronous version of put_b().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type b: Float
+            @param b: the new value of b
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: completes when the element is updated
+        """
+        def action():
+            self.b_elem = b
+        return self.__submit(node, "put_b", width(b), priority, action)
+
+
+    def submit_get_A_range(self, node, start, stop, priority=0):
+        """
+            Asynchronous version of get_A_range().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: the pending elements of matrix A
+        """
+        return self.__submit(node, "get_A_range", stop - start, priority,
+            lambda: self.A_row[start:stop])
+
+
+    def submit_put_A_range(self, node, start, values, priority=0):
+        """
+            Asynchronous version of put_A_range().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the column of the first element
+            @type values: List of Float
+            @param values: the new element values
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: completes when the elements are updated
+        """
+        values = list(values)
+        def action():
+            self.A_row[start:start + len(values)] = values
+        return self.__submit(node, "put_A_range", len(values), priority,
+            action)
+
+
+    def submit_get_row(self, node, start, stop, priority=0):
+        """
+            Asynchronous version of get_row().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: the pending elements of matrix A and element of b
+        """
+        return self.__submit(node, "get_row",
+            stop - start + width(self.b_elem), priority,
+            lambda: (self.A_row[start:stop], self.b_elem))
+
+
+    def submit_put_row(self, node, start, values, b, priority=0):
+        """
+            Asynchronous version of put_row().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the column of the first element
+            @type values: List of Float
+            @param values: the new element values
+            @type b: Float
+            @param b: the new value of b
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: completes when the elements are updated
+        """
+        values = list(values)
+        def action():
+            self.A_row[start:start + len(values)] = values
+            self.b_elem = b
+        return self.__submit(node, "put_row", len(values) + width(b),
+            priority, action)
+
+
+    def submit_get_sparse_row(self, node, start, stop, priority=0):
+        """
+            Asynchronous version of get_sparse_row().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: the pending nonzero elements and element of b
+        """
+        return self.__submit(node, "get_sparse_row", None, priority, None,
+            lambda: self.__read_sparse_row(start, stop))
+
+
+    def submit_put_sparse_row(self, node, start, stop, indices, values,
+        b=None, priority=0):
+        """
+            Asynchronous version of put_sparse_row().
+
+            @type node: Node
+            @param node: the node accessing the datastore; must be the node that
+                owns the datastore
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type indices: List of Integer
+            @param indices: the columns of the nonzero elements, increasing
+            @type values: List of Float
+            @param values: the nonzero elements
+            @type b: Float
+            @param b: the new value of b; None to keep it
+            @type priority: Integer
+            @param priority: the priority of the request when the datastore
+                queues the requests exceeding the in-flight limit; lower values
+                are served first
+
+            @rtype: Future
+            @return: completes when the elements are updated
+        """
+        indices = list(indices)
+        values = list(values)
+        def action():
+            set_nonzeros(self.A_row, start, stop, indices, values)
+            if b is not None:
+                self.b_elem = b
+        return self.__submit(node, "put_sparse_row",
+            len(values) + (width(b) if b is not None else 0), priority,
+            action)
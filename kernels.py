@@ -0,0 +1,162 @@
+"""
+    This module provides the vector kernels used by the nodes for their row
+    arithmetic. Vectors are lists or arrays of floats (see the 'array'
+    module); the kernels updating a vector in place keep its type. Sparse
+    vectors are pairs of lists (indices, values) holding the nonzero
+    elements, by increasing index.
+
+    The kernels are written as comprehensions over izip, to avoid the
+    per-element index arithmetic of explicit loops.
+
+    Computer Systems Architecture Course
+    Assignment 1 - Cluster Activity Simulation
+    March 2014
+"""
+
+
+from array import array
+from bisect import bisect_left
+from itertools import izip
+from operator import mul
+
+
+def like(vector, values):
+    """
+        Converts values to the type of a vector, to be assigned to a slice of
+        it.
+
+        @type vector: List or array of Float
+        @param vector: the vector whose type is used
+        @type values: Iterable of Float
+        @param values: the values to convert
+        @rtype: List or array of Float
+        @return: the converted values
+    """
+    if isinstance(vector, array):
+        return array(vector.typecode, values)
+    if isinstance(values, list):
+        return values
+    return list(values)
+
+
+def axpy(alpha, x, y, start = 0, stop = None, offset = 0):
+    """
+        Adds a multiple of a vector to another one, in place:
+        y[j] += alpha * x[j - offset], for j in start..stop-1.
+
+        @type alpha: Float
+        @param alpha: the multiple
+        @type x: List or array of Float
+        @param x: the added vector
+        @type y: List or array of Float
+        @param y: the updated vector
+        @type start: Integer
+        @param start: the first updated element of y
+        @type stop: Integer
+        @param stop: the element of y after the last updated one; the end of
+            y if not given
+        @type offset: Integer
+        @param offset: the index in y of the first element of x
+    """
+    if stop is None:
+        stop = len(y)
+    if alpha == 0 or start >= stop:
+        return
+
+    xs = x[start - offset:stop - offset]
+    values = [yj + alpha * xj for (yj, xj) in izip(y[start:stop], xs)]
+    y[start:stop] = like(y, values)
+
+
+def dot(x, y):
+    """
+        Returns the dot product of two vectors of the same length.
+
+        @type x: List or array of Float
+        @param x: the first vector
+        @type y: List or array of Float, or List of Vector
+        @param y: the second vector; its elements may also be Vectors of
+            right-hand sides, see matrix.Vector
+        @rtype: Float or Vector
+        @return: the sum of x[j] * y[j]
+    """
+    return sum(map(mul, x, y), 0.0)
+
+
+def sparsify(x, offset = 0):
+    """
+        Returns the nonzero elements of a vector.
+
+        @type x: List or array of Float
+        @param x: the vector
+        @type offset: Integer
+        @param offset: added to the indices
+        @rtype: (List of Integer, List of Float)
+        @return: the sparse vector
+    """
+    indices = [j for j in xrange(len(x)) if x[j] != 0]
+    return ([j + offset for j in indices], [x[j] for j in indices])
+
+
+def densify(x, length, offset = 0):
+    """
+        Returns the dense form of a sparse vector.
+
+        @type x: (List of Integer, List of Float)
+        @param x: the sparse vector
+        @type length: Integer
+        @param length: the length of the result
+        @type offset: Integer
+        @param offset: subtracted from the indices
+        @rtype: List of Float
+        @return: the dense vector
+    """
+    y = [0.0] * length
+    for (j, value) in izip(*x):
+        y[j - offset] = value
+    return y
+
+
+def sparse_dot(x, y):
+    """
+        Returns the dot product of a sparse vector and a dense one.
+
+        @type x: (List of Integer, List of Float)
+        @param x: the sparse vector
+        @type y: List or array of Float
+        @param y: the dense vector
+        @rtype: Float
+        @return: the sum of x[j] * y[j] over the nonzero elements of x
+    """
+    (indices, values) = x
+    return sum([value * y[j] for (j, value) in izip(indices, values)], 0.0)
+
+
+def sparse_axpy(alpha, x, y, start = 0, stop = None, offset = 0):
+    """
+        Adds a multiple of a sparse vector to a dense one, in place, see
+        axpy(); only the nonzero elements of x are visited.
+
+        @type alpha: Float
+        @param alpha: the multiple
+        @type x: (List of Integer, List of Float)
+        @param x: the added sparse vector
+        @type y: List or array of Float
+        @param y: the updated vector
+        @type start: Integer
+        @param start: the first updated element of y
+        @type stop: Integer
+        @param stop: the element of y after the last updated one; the end of
+            y if not given
+        @type offset: Integer
+        @param offset: the index in y of the element 0 of x
+    """
+    if stop is None:
+        stop = len(y)
+    if alpha == 0 or start >= stop:
+        return
+
+    (indices, values) = x
+    for p in xrange(bisect_left(indices, start - offset),
+            bisect_left(indices, stop - offset)):
+        y[indices[p] + offset] += alpha * values[p]
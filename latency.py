@@ -0,0 +1,236 @@
+"""
+    This module provides the latency models used by the datastores to compute
+    the time taken by each request.
+
+    Every model draws its random numbers from one stream per key, seeded
+    from the model seed and the key. The datastores use one key per node and
+    kind of request, so that the delays do not depend on the way the threads
+    are interleaved nor on the names of the threads serving the requests.
+
+    Computer Systems Architecture Course
+    Assignment 1 - Cluster Activity Simulation
+    March 2014
+"""
+
+
+from random import Random
+from threading import Lock
+
+
+# names of the models, as used in the test files
+LATENCY_MODELS = ("uniform", "fixed", "lognormal")
+
+
+class LatencyModel:
+    """
+        Base class of the latency models. Subclasses implement
+        'base_delay'; the delay of a request is the base delay plus
+        'transfer_delay' for every transferred element after the first one.
+    """
+
+    def __init__(self, seed, transfer_delay=0):
+        """
+            Constructor.
+
+            @type seed: Integer
+            @param seed: seed of the random streams
+            @type transfer_delay: Float
+            @param transfer_delay: the extra time taken by a request for each
+                transferred element after the first one
+        """
+        self.seed = seed
+        self.transfer_delay = transfer_delay
+        self.streams = {}
+        self.lock = Lock()
+
+
+    def random(self, key):
+        """
+            Returns the random stream of a key. Must be called with the lock
+            held.
+
+            @type key: String
+            @param key: the name of the stream
+
+            @rtype: Random
+            @return: the random number generator of the key
+        """
+        if key not in self.streams:
+            self.streams[key] = Random("%s:%s" % (self.seed, key))
+        return self.streams[key]
+
+
+    def base_delay(self, random):
+        """
+            Returns the time taken by a request transferring a single element.
+
+            @type random: Random
+            @param random: the random stream to draw from
+
+            @rtype: Float
+            @return: the delay, in seconds
+        """
+        raise NotImplementedError()
+
+
+    def delay(self, count=1, key=""):
+        """
+            Returns the time taken by a request. Requests with the same key
+            take the successive delays of one random stream.
+
+            @type count: Integer
+            @param count: the number of elements transferred by the request
+            @type key: String
+            @param key: the name of the random stream
+
+            @rtype: Float
+            @return: the delay, in seconds
+        """
+        with self.lock:
+            delay = self.base_delay(self.random(key))
+        if count > 1:
+            delay += (count - 1) * self.transfer_delay
+        return delay
+
+
+class FixedLatency(LatencyModel):
+    """
+        Every request takes the same time.
+    """
+
+    def __init__(self, delay, transfer_delay=0):
+        """
+            Constructor.
+
+            @type delay: Float
+            @param delay: the time taken by a request
+            @type transfer_delay: Float
+            @param transfer_delay: the extra time taken by a request for each
+                transferred element after the first one
+        """
+        LatencyModel.__init__(self, 0, transfer_delay)
+        self.fixed_delay = delay
+
+
+    def base_delay(self, random):
+        return self.fixed_delay
+
+
+class UniformLatency(LatencyModel):
+    """
+        Request times are uniformly distributed in an interval.
+    """
+
+    def __init__(self, delay_min, delay_max, seed, transfer_delay=0):
+        """
+            Constructor.
+
+            @type delay_min: Float
+            @param delay_min: the minimum time taken by a request
+            @type delay_max: Float
+            @param delay_max: the maximum time taken by a request
+            @type seed: Integer
+            @param seed: seed of the random streams
+            @type transfer_delay: Float
+            @param transfer_delay: the extra time taken by a request for each
+                transferred element after the first one
+        """
+        LatencyModel.__init__(self, seed, transfer_delay)
+        self.delay_min = delay_min
+        self.delay_max = delay_max
+
+
+    def base_delay(self, random):
+        return random.uniform(self.delay_min, self.delay_max)
+
+
+class LognormalLatency(LatencyModel):
+    """
+        Request times are at least 'delay_min', with a lognormal excess whose
+        median puts half of the requests below the middle of the interval.
+        The tail is heavy: some requests take much longer than 'delay_max'.
+    """
+
+    def __init__(self, delay_min, delay_max, sigma, seed, transfer_delay=0):
+        """
+            Constructor.
+
+            @type delay_min: Float
+            @param delay_min: the minimum time taken by a request
+            @type delay_max: Float
+            @param delay_max: the upper end of the typical request times
+            @type sigma: Float
+            @param sigma: the shape of the tail; larger is heavier
+            @type seed: Integer
+            @param seed: seed of the random streams
+            @type transfer_delay: Float
+            @param transfer_delay: the extra time taken by a request for each
+                transferred element after the first one
+        """
+        LatencyModel.__init__(self, seed, transfer_delay)
+        self.delay_min = delay_min
+        self.scale = (delay_max - delay_min) / 2.0
+        self.sigma = sigma
+
+
+    def base_delay(self, random):
+        return self.delay_min + \
+            self.scale * random.lognormvariate(0, self.sigma)
+
+
+class StragglerLatency(LatencyModel):
+    """
+        Slows down another model by a constant factor; used to give some
+        datastores slower storage than the others.
+    """
+
+    def __init__(self, model, slowdown):
+        """
+            Constructor.
+
+            @type model: LatencyModel
+            @param model: the model of a normal datastore
+            @type slowdown: Float
+            @param slowdown: the factor by which requests are slower
+        """
+        LatencyModel.__init__(self, model.seed, model.transfer_delay)
+        self.model = model
+        self.slowdown = slowdown
+
+
+    def delay(self, count=1, key=""):
+        return self.model.delay(count, key) * self.slowdown
+
+
+def create_latency_model(name, delay_min, delay_max, seed, transfer_delay=0,
+    sigma=1.0):
+    """
+        Creates a latency model given its name, as used in the test files.
+
+        @type name: String
+        @param name: 'fixed', 'uniform' or 'lognormal'; None or 0 for the
+            default, 'uniform'
+        @type delay_min: Float
+        @param delay_min: the minimum time taken by a request
+        @type delay_max: Float
+        @param delay_max: the maximum (typical, for 'lognormal') time taken by
+            a request; 'fixed' uses the middle of the interval
+        @type seed: Integer
+        @param seed: seed of the random streams
+        @type transfer_delay: Float
+        @param transfer_delay: the extra time taken by a request for each
+            transferred element after the first one
+        @type sigma: Float
+        @param sigma: the shape of the 'lognormal' tail
+
+        @rtype: LatencyModel
+        @return: the new model
+    """
+    if not name or name == "uniform":
+        return UniformLatency(delay_min, delay_max, seed, transfer_delay)
+    if name == "fixed":
+        return FixedLatency((delay_min + delay_max) / 2.0, transfer_delay)
+    if name == "lognormal":
+        return LognormalLatency(delay_min, delay_max, sigma, seed,
+            transfer_delay)
+    raise ValueError("unknown latency model '%s'" % name)
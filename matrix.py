@@ -0,0 +1,440 @@
+"""
+    This module provides the compact matrices used by the tester. A dense
+    matrix keeps its elements in a single array of doubles, and the
+    datastores get views of its rows which are only copied when first
+    written. A sparse matrix keeps only the nonzero elements of each row.
+    Tests with several right-hand sides store a Vector as each element of b
+    and x.
+
+    Computer Systems Architecture Course
+    Assignment 1 - Cluster Activity Simulation
+    March 2014
+"""
+
+
+from array import array
+from bisect import bisect_left
+from operator import add, div, mul, sub
+
+from kernels import densify, dot, sparsify
+
+
+class Matrix:
+    """
+        Square matrix stored row after row in one array of doubles. Indexing
+        the matrix gives a RowView of a row; the matrix itself is never
+        modified through its views.
+    """
+
+    def __init__(self, dim, data = None):
+        """
+            Constructor.
+
+            @type dim: Integer
+            @param dim: the dimension of the matrix
+            @type data: array of Float
+            @param data: the dim * dim elements, row after row; zeros if not
+                given
+        """
+        if data is None:
+            data = array("d", [0.0]) * (dim * dim)
+        if len(data) != dim * dim:
+            raise ValueError("expected %d elements, not %d" %
+                (dim * dim, len(data)))
+        self.dim = dim
+        self.data = data
+
+
+    def __len__(self):
+        return self.dim
+
+
+    def __getitem__(self, i):
+        """
+            Returns a copy-on-write view of a row.
+
+            @type i: Integer
+            @param i: the index of the row
+            @rtype: RowView
+            @return: the view
+        """
+        if i < 0:
+            i += self.dim
+        if not 0 <= i < self.dim:
+            raise IndexError("row index out of range")
+        return RowView(self.data, i * self.dim, self.dim)
+
+
+    def multiply(self, x):
+        """
+            Returns the product of the matrix with a vector.
+
+            @type x: List or array of Float
+            @param x: the vector
+            @rtype: array of Float
+            @return: the product
+        """
+        return array("d", [dot(self[i][:], x) for i in range(self.dim)])
+
+
+class RowView:
+    """
+        Row of a Matrix, sharing the matrix storage until it is first written;
+        the first write copies the row into an array of its own. Reads of
+        single elements return floats and slices return lists, like a list
+        row would.
+
+        In Python 2 arrays do not support memoryview, so the view keeps the
+        offset of the row in the shared array instead.
+    """
+
+    def __init__(self, data, start, length):
+        """
+            Constructor.
+
+            @type data: array of Float
+            @param data: the storage of the matrix
+            @type start: Integer
+            @param start: the position of the row in the storage
+            @type length: Integer
+            @param length: the number of elements of the row
+        """
+        self.data = data
+        self.start = start
+        self.length = length
+        self.copied = False
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            (start, stop, step) = key.indices(self.length)
+            if step != 1:
+                return self.tolist()[key]
+            return self.data[self.start + start:
+                self.start + max(start, stop)].tolist()
+        return self.data[self.start + self.index(key)]
+
+
+    def __setitem__(self, key, value):
+        if not self.copied:
+            self.data = self.data[self.start:self.start + self.length]
+            self.start = 0
+            self.copied = True
+
+        if not isinstance(key, slice):
+            self.data[self.index(key)] = value
+            return
+        (start, stop, step) = key.indices(self.length)
+        values = array(self.data.typecode, value)
+        if step != 1 or len(values) != max(stop - start, 0):
+            raise ValueError("the length of a row cannot change")
+        self.data[start:stop] = values
+
+
+    def index(self, i):
+        """
+            Checks an element index, counting negative indices from the end.
+
+            @type i: Integer
+            @param i: the index
+            @rtype: Integer
+            @return: the index of the element in the row
+        """
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("row index out of range")
+        return i
+
+
+    def tolist(self):
+        """
+            Returns the elements of the row.
+
+            @rtype: List of Float
+            @return: a copy of the row
+        """
+        return self.data[self.start:self.start + self.length].tolist()
+
+
+class SparseMatrix:
+    """
+        Square matrix stored as one SparseRow per row. Indexing the matrix
+        gives a copy of a row.
+    """
+
+    def __init__(self, dim, rows):
+        """
+            Constructor.
+
+            @type dim: Integer
+            @param dim: the dimension of the matrix
+            @type rows: List of SparseRow
+            @param rows: the rows of the matrix
+        """
+        if len(rows) != dim:
+            raise ValueError("expected %d rows, not %d" % (dim, len(rows)))
+        self.dim = dim
+        self.rows = rows
+
+
+    def __len__(self):
+        return self.dim
+
+
+    def __getitem__(self, i):
+        """
+            Returns a copy of a row.
+
+            @type i: Integer
+            @param i: the index of the row
+            @rtype: SparseRow
+            @return: the copy
+        """
+        row = self.rows[i]
+        return SparseRow(row.length, row.indices[:], row.values[:])
+
+
+    def multiply(self, x):
+        """
+            Returns the product of the matrix with a vector, see
+            Matrix.multiply.
+        """
+        result = array("d")
+        for row in self.rows:
+            result.append(sum([value * x[j] for (j, value)
+                in zip(row.indices, row.values)], 0.0))
+        return result
+
+
+class SparseRow:
+    """
+        Row stored as its nonzero elements, by increasing column. It can be
+        used as a dense row, like a RowView, and also reads and writes its
+        nonzero elements directly with nonzeros() and set_nonzeros().
+    """
+
+    def __init__(self, length, indices = None, values = None):
+        """
+            Constructor.
+
+            @type length: Integer
+            @param length: the number of elements of the row
+            @type indices: List of Integer
+            @param indices: the columns of the nonzero elements, increasing
+            @type values: List of Float
+            @param values: the nonzero elements
+        """
+        self.length = length
+        self.indices = indices or []
+        self.values = values or []
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            (start, stop, step) = key.indices(self.length)
+            if step != 1:
+                return self.tolist()[key]
+            stop = max(start, stop)
+            return densify(self.nonzeros(start, stop), stop - start, start)
+
+        i = self.index(key)
+        p = bisect_left(self.indices, i)
+        if p < len(self.indices) and self.indices[p] == i:
+            return self.values[p]
+        return 0.0
+
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            (start, stop, step) = key.indices(self.length)
+            value = list(value)
+            if step != 1 or len(value) != max(stop - start, 0):
+                raise ValueError("the length of a row cannot change")
+            (indices, values) = sparsify(value, start)
+            self.set_nonzeros(start, stop, indices, values)
+            return
+
+        i = self.index(key)
+        p = bisect_left(self.indices, i)
+        if p < len(self.indices) and self.indices[p] == i:
+            if value != 0:
+                self.values[p] = value
+            else:
+                del self.indices[p]
+                del self.values[p]
+        elif value != 0:
+            self.indices.insert(p, i)
+            self.values.insert(p, value)
+
+
+    def index(self, i):
+        """
+            Checks an element index, see RowView.index.
+        """
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("row index out of range")
+        return i
+
+
+    def nonzeros(self, start = 0, stop = None):
+        """
+            Returns the nonzero elements between two columns.
+
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one; the end of the row if
+                not given
+            @rtype: (List of Integer, List of Float)
+            @return: the columns and the values of the elements
+        """
+        if stop is None:
+            stop = self.length
+        lo = bisect_left(self.indices, start)
+        hi = bisect_left(self.indices, stop)
+        return (self.indices[lo:hi], self.values[lo:hi])
+
+
+    def set_nonzeros(self, start, stop, indices, values):
+        """
+            Replaces the elements between two columns.
+
+            @type start: Integer
+            @param start: the first column
+            @type stop: Integer
+            @param stop: the column after the last one
+            @type indices: List of Integer
+            @param indices: the columns of the new nonzero elements,
+                increasing, between 'start' and 'stop'
+            @type values: List of Float
+            @param values: the new nonzero elements
+        """
+        pairs = [(j, value) for (j, value) in zip(indices, values)
+            if value != 0]
+        lo = bisect_left(self.indices, start)
+        hi = bisect_left(self.indices, stop)
+        self.indices[lo:hi] = [j for (j, value) in pairs]
+        self.values[lo:hi] = [value for (j, value) in pairs]
+
+
+    def tolist(self):
+        """
+            Returns the elements of the row.
+
+            @rtype: List of Float
+            @return: the dense row
+        """
+        return densify((self.indices, self.values), self.length)
+
+
+class Vector:
+    """
+        Element of b, or of x, of a row for all the right-hand sides solved
+        together. Vectors are never modified: the arithmetic operators work
+        element by element, with a float or another Vector, and return a new
+        Vector, so the nodes update all the right-hand sides with the same
+        expressions as a single one. abs() gives the largest magnitude of the
+        elements, the value the iterative solvers test for convergence.
+    """
+
+    def __init__(self, values):
+        """
+            Constructor.
+
+            @type values: Iterable of Float
+            @param values: one element per right-hand side
+        """
+        self.values = array("d", values)
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+
+    def __iter__(self):
+        return iter(self.values)
+
+
+    def __repr__(self):
+        return "Vector(%s)" % self.values.tolist()
+
+
+    def tolist(self):
+        """
+            Returns the elements of the vector.
+
+            @rtype: List of Float
+            @return: one element per right-hand side
+        """
+        return self.values.tolist()
+
+
+    def combine(self, other, op):
+        """
+            Applies a binary operator element by element.
+
+            @type other: Float or Vector
+            @param other: the second operand
+            @type op: Function
+            @param op: the operator
+            @rtype: Vector
+            @return: the results
+        """
+        if isinstance(other, Vector):
+            return Vector(map(op, self.values, other.values))
+        return Vector([op(value, other) for value in self.values])
+
+
+    def __add__(self, other):
+        return self.combine(other, add)
+
+    __radd__ = __add__
+
+
+    def __sub__(self, other):
+        return self.combine(other, sub)
+
+
+    def __rsub__(self, other):
+        return self.combine(other, lambda a, b: b - a)
+
+
+    def __mul__(self, other):
+        return self.combine(other, mul)
+
+    __rmul__ = __mul__
+
+
+    def __div__(self, other):
+        return self.combine(other, div)
+
+    __truediv__ = __div__
+
+
+    def __rdiv__(self, other):
+        return self.combine(other, lambda a, b: b / a)
+
+    __rtruediv__ = __rdiv__
+
+
+    def __neg__(self):
+        return Vector([-value for value in self.values])
+
+
+    def __abs__(self):
+        return max([abs(value) for value in self.values] or [0.0])
@@ -5,16 +5,108 @@
     Assignment 1 - Cluster Activity Simulation
     March 2014
 """
-from threading import Semaphore
+from array import array
+from threading import Event, Thread
 import Queue
 
+import collectives
+import kernels
+from datastore import wait_all
+from scheduler import PIVOT, RequestScheduler, TRAILING
+from util import ADAPTIVE_WINDOW, BANDED, BANDWIDTH, CACHE_MODE, CG, \
+	GAUSS_SEIDEL, JACOBI, LOOKAHEAD, MAX_ITERATIONS, PANEL_WIDTH, PRECISION, \
+	REFINEMENT_STEPS, SINGLE, SOLVER, SPARSE, WRITE_THROUGH
+
+# Message types
+X = 4           # last element of x and the permutation, sent to node 0
+PANEL = 6       # pivot row of a panel, sent to the first pivot of the panel
+BAND = 7        # the pivot candidates, sent to a node entering the band
+THOMAS = 8      # reduced element of the super-diagonal and of b, sent down
+SOLVE = 9       # new element of b to solve for, sent by solve()
+STOP = 5        # asks the node thread to terminate
+
+# Largest correction |r_i / a_ii| of a converged iterative solution, well
+# below the 3 decimals the results are checked to
+TOLERANCE = 1e-9
+# Growth of the largest correction over its first value after which an
+# iterative solver is considered to diverge
+DIVERGENCE = 1e6
+
+
+class NodeShutdown(Exception):
+	"""
+		Raised in a node thread when the node is asked to shut down while the
+		thread waits for a message.
+	"""
+	pass
+
+
 class Node:
-    """
-        Class that represents a cluster node with computation and storage
-        functionalities.
-    """
+	"""
+		Class that represents a cluster node with computation and storage
+		functionalities.
+
+		Node i stores row i of A and element i of b. The elimination uses
+		partial pivoting without moving any row: at step k the nodes whose
+		rows were not chosen yet find the largest element in column k with an
+		argmax allreduce, and the winner becomes logical row k of the upper
+		triangular matrix and broadcasts its row. All the nodes taking part
+		in a step record the winner in a permutation vector, which back
+		substitution, running from logical row n-1 up, follows to find the
+		node solving the previous element of x.
+
+		With the 'lookahead' option the node reads its row asynchronously,
+		the columns of the first panel before the rest, and only updates the
+		columns of the next panel as soon as a panel arrives; the rest of the
+		update is deferred until the node has sent its candidate for the next
+		pivot and is waiting for the result.
+
+		With 'precision' set to 'single' the rows are kept and sent as arrays
+		of floats, so the elimination runs in single precision; the solution
+		is then improved by 'refinement_steps' (2 if not given) steps of
+		iterative refinement, using residuals computed in double precision
+		from the original rows and the L and U factors kept by the nodes.
+
+		The element of b stored by a datastore may be a Vector holding one
+		element per right-hand side (see matrix.Vector); the nodes then
+		apply every pivot to all the right-hand sides with the same
+		arithmetic, and the factorization and the pivot messages are shared
+		by all of them.
+
+		With the 'sparse' option the rows are read from and written to the
+		datastore as their nonzero elements, and the panel rows are sent as
+		nonzero elements too; the trailing updates only visit the nonzero
+		elements of the pivot rows.
+
+		Banded systems are solved by a band-limited engine, selected with the
+		'banded' option, which finds the bandwidth with an allreduce, or by
+		giving the half-bandwidth in 'bandwidth'. At step k only the lower+1
+		candidate rows take part in the pivot search, the pivot row is
+		limited to the columns k..k+lower+upper and back substitution only
+		sends x_j to the rows within the band. Diagonally dominant
+		tridiagonal systems found by the allreduce are solved with the
+		Thomas algorithm instead.
+
+		The factors stay on the nodes after get_x() returns: every node keeps
+		its row of L and U and the permutation, and solve() solves the
+		system again for a new b with one forward and one back substitution
+		wavefront, without eliminating again.
 
-	def __init__(self, node_id, matrix_size):
+		The 'solver' option selects an iterative engine instead of the
+		elimination, for diagonally dominant or symmetric positive definite
+		systems: 'jacobi', 'gauss_seidel' (multicolour: the rows are coloured
+		by id modulo the largest |i - j| of a nonzero a_ij plus one, so that
+		the rows of one colour are not coupled, and the colours update in
+		turns; red-black for tridiagonal matrices, one row at a time for
+		dense ones) or 'cg' (conjugate gradient). Every iteration
+		gathers x, or the residual for 'cg', on all the nodes and reduces the
+		largest correction |r_i / a_ii|; the iterations stop when it falls
+		below TOLERANCE. If the solver diverges or does not converge in
+		'max_iterations' iterations (1000 if not given), the nodes fall back
+		to the elimination.
+	"""
+
+	def __init__(self, node_id, matrix_size, options = None):
 		"""
 			Constructor.
 
@@ -23,94 +115,835 @@ class Node:
 				identifying the node
 			@type matrix_size: Integer
 			@param matrix_size: the size of the matrix A
+			@type options: Dictionary
+			@param options: the node parameters taken from the test, keys
+				are defined in util.py
 		"""
 		self.node_id = node_id
 		self.matrix_size = matrix_size
+		self.options = options or {}
 		self.datastore = None
+		self.cache = None
 		self.nodes = None
-		# TODO other code
-		self.sem = Semaphore(value = 0)
-		self.sema = None
-		self.pivot = 0
+		self.io = None
 		self.my_thread = None
 		self.queue = Queue.Queue()
+		self.pending = {}
+		self.perm = []
+		self.logical = None
+		self.reach = matrix_size
+		self.index = None
+		self.lower = []
+		self.deferred = None
+		self.tridiagonal = None
+		self.colours = None
+		self.solves = 0
+		self.result = None
+		self.result_ready = Event()
 
-	def get_A(self, column):
-		self.sema.acquire()
-		el = self.datastore.get_A(self, column)
-		self.sema.release()
-		return el
+	def get_A(self, column, priority = TRAILING):
+		return self.io.submit("get_A", (column,), priority).result()
 
-	def put_A(self, column, A):
-		self.sema.acquire()
-		self.datastore.put_A(self, column, A)
-		self.sema.release()
+	def put_A(self, column, A, priority = TRAILING):
+		self.io.submit("put_A", (column, A), priority).result()
 
-	def get_b(self):
-		self.sema.acquire()
-		el = self.datastore.get_b(self)
-		self.sema.release()
-		return el	
+	def get_b(self, priority = TRAILING):
+		return self.io.submit("get_b", (), priority).result()
+
+	def put_b(self, b, priority = TRAILING):
+		self.io.submit("put_b", (b,), priority).result()
+
+	def get_row(self, start, stop, priority = TRAILING):
+		return self.io.submit("get_row", (start, stop), priority).result()
+
+	def put_A_range(self, start, values, priority = TRAILING):
+		self.io.submit("put_A_range", (start, values), priority).result()
+
+	def put_row(self, start, values, b, priority = TRAILING):
+		self.io.submit("put_row", (start, values, b), priority).result()
+
+	def get_sparse_row(self, start, stop, priority = TRAILING):
+		return self.io.submit("get_sparse_row", (start, stop), priority).result()
+
+	def put_sparse_row(self, start, stop, indices, values, b = None,
+		priority = TRAILING):
+		self.io.submit("put_sparse_row", (start, stop, indices, values, b),
+			priority).result()
+
+	def submit_get_sparse_row(self, start, stop, priority = TRAILING):
+		return self.io.submit("get_sparse_row", (start, stop), priority)
+
+	def submit_put_sparse_row(self, start, stop, indices, values, b = None,
+		priority = TRAILING):
+		return self.io.submit("put_sparse_row",
+			(start, stop, indices, values, b), priority)
+
+	def submit_get_A_range(self, start, stop, priority = TRAILING):
+		return self.io.submit("get_A_range", (start, stop), priority)
+
+	def submit_get_row(self, start, stop, priority = TRAILING):
+		return self.io.submit("get_row", (start, stop), priority)
 
-	def put_b(self, b):
-		self.sema.acquire()
-		self.datastore.put_b(self, b)
-		self.sema.release()
+	def submit_put_A(self, column, A, priority = TRAILING):
+		return self.io.submit("put_A", (column, A), priority)
 
+	def submit_put_b(self, b, priority = TRAILING):
+		return self.io.submit("put_b", (b,), priority)
+
+	def submit_put_A_range(self, start, values, priority = TRAILING):
+		return self.io.submit("put_A_range", (start, values), priority)
+
+	def send(self, node, tip, step, data = None):
+		"""
+			Sends a message to a node (possibly this one).
+
+			@type node: Node
+			@param node: the destination
+			@type tip: Integer
+			@param tip: the message type
+			@type step: Integer
+			@param step: the elimination step the message belongs to
+			@param data: the message contents
+		"""
+		node.queue.put(Message(tip, self, step, data))
+
+	def receive(self, tips, step):
+		"""
+			Waits for a message of one of the given types, belonging to the
+			given step. Messages arriving for other steps or of other types
+			are kept until they are asked for, so messages sent by different
+			nodes can arrive in any order.
+
+			@type tips: Tuple of Integer
+			@param tips: the accepted message types
+			@type step: Integer
+			@param step: the step the message belongs to
+			@rtype: Message
+			@return: the first received message matching the request
+		"""
+		pending = self.pending.get(step, [])
+		for msg in pending:
+			if msg.tip in tips:
+				pending.remove(msg)
+				return msg
+
+		while True:
+			msg = self.queue.get()
+			if msg.tip == STOP:
+				raise NodeShutdown()
+			if msg.step == step and msg.tip in tips:
+				return msg
+			self.pending.setdefault(msg.step, []).append(msg)
 
 	def comp(self):
-		self.datastore.register_thread(self, my_thread)
-		num = self.node_id;
-		while (num >= 1):
-			el = self.queue.get()
-			if (el.tip == 0):
-				#cer linia si o trimit
-				l = []
-				for i in range (self.node_id, self.matrix_size):
-					l[i-node_id] = self.datastore.get_A(self, i)
-				msg = Message(1, self)
-				msg.add_line(l)
-				el.node.queue.put(msg)
-				msg2 = self.queue.get()
-				if (msg2.tip == 3):
-					for i in range (len(l)):
-						self.datastore.put_A(self, msg2.node.node_id + i)
-			else if (el.tip == 1):
-				#cer linia si fac zero pe node_id - num
-				# o trimit la datastore
-			num--
-		if (self.datastore.get_A(self, node_id) == 0):
-			# trimit la toti mesaj cu tip 0 si fac si schimbarile si ii atentionez pe toti
-			msg = Message(0, self)
-			for nod in self.nodes
-				nod.queue.put(msg)
-			trim = 0;
-			for i in range (len(self.nodes) - 1)
-				msg = self.queue.get()
-				if (msg.line[0] != 0 && trim == 0):
-					trim = trim + 1
-					msg2 = Message(3, self)
-					l = []
-					for j in range (self.node_id, self.matrix_size):
-						l[j-node_id] = self.datastore.get_A(self, j)
-					msg2.add_line(l)
-					msg.node.queue.put(msg2)
-				else:
-					msg2 = Message(2, self)
-					msg.node.queue.put(msg2)
-		# trimit linia mea la toti:
-		for nod in self.nodes:
-			l = []
-			for i in range (self.node_id, self.matrix_size):
-				l[i-node_id] = self.datastore.get_A(self, i)
-			msg = Message(1, self)
-			msg.add_line(l)
-			nod.queue.put(msg)
-		# daca node_id != size
-			# astept mesaj de la node_id + 1
-		# calculez x
-		# daca node_id != 0
-			# trimit mesaj cu x lu' node_id - 1
+		"""
+			Body of the node thread: solves the node's equation and makes the
+			result available to get_x().
+		"""
+		try:
+			x = None
+			if self.options.get(SOLVER) in (JACOBI, GAUSS_SEIDEL, CG):
+				self.cache.load()
+				x = self.iterate(self.options.get(SOLVER))
+			if x is None:
+				x = self.solve_direct()
+			self.cache.flush()
+			self.publish(x)
+
+			solve = 1
+			while True:
+				b = self.receive((SOLVE,), ("solve", solve)).data
+				self.publish(self.resolve(b, solve))
+				solve += 1
+		except NodeShutdown:
+			return
+
+	def publish(self, x):
+		"""
+			Makes a result available to get_x() or solve().
+
+			@type x: Float or Vector
+			@param x: the node's element of x
+		"""
+		if hasattr(x, "tolist"):
+			x = x.tolist()
+		self.result = (x, self.index)
+		self.result_ready.set()
+
+	def resolve(self, b, solve):
+		"""
+			Solves the system again for a new b, with the factors kept by the
+			first solve: forward and back substitution with L and U, the
+			sweeps of the Thomas algorithm, or the iterations of the
+			iterative solver, which keeps no factors. If the iterations do
+			not converge, which all the nodes see in the same reduced value,
+			the nodes factor the matrix once and use the factors for this
+			and the next re-solves.
+
+			@type b: Float or Vector
+			@param b: the node's element of the new b
+			@type solve: Integer
+			@param solve: the number of the re-solve, identifying its steps
+			@rtype: Float or Vector
+			@return: the element of x
+		"""
+		if self.tridiagonal is None and self.logical is None:
+			x = self.iterate(self.options.get(SOLVER), b, solve)
+			if x is not None:
+				return x
+			self.index = None
+			self.solve_direct()
+			self.cache.flush()
+
+		if self.tridiagonal is not None:
+			return self.thomas(b, solve)
+		y = self.forward_substitute(b, ("y", solve))
+		x = self.back_substitute(y, ("x", solve), self.matrix_size - 1)
+		if self.options.get(PRECISION) == SINGLE:
+			x = self.refine(x, b, solve)
+		return x
+
+	def solve_direct(self):
+		"""
+			Solves the node's equation by elimination.
+
+			@rtype: Float
+			@return: the element of x
+		"""
+		banded = self.options.get(BANDED) or self.options.get(BANDWIDTH)
+		if self.cache.row is None:
+			if self.options.get(LOOKAHEAD) and not banded:
+				self.cache.load(self.options.get(PANEL_WIDTH) or 1)
+			else:
+				self.cache.load()
+
+		if banded:
+			x = self.solve_banded()
+		else:
+			self.eliminate()
+			x = self.substitute()
+		if self.options.get(PRECISION) == SINGLE:
+			x = self.refine(x, self.cache.original_b)
+		return x
+
+	def iterate(self, solver, b = None, solve = 0):
+		"""
+			Solves the node's equation with an iterative solver, in double
+			precision, from the original row.
+
+			@type solver: String
+			@param solver: JACOBI, GAUSS_SEIDEL or CG
+			@type b: Float or Vector
+			@param b: the element of b; the stored one if not given
+			@type solve: Integer
+			@param solve: the number of the re-solve, 0 for the first solve
+			@rtype: Float
+			@return: the element of x, or None if the solver did not converge
+		"""
+		row = self.cache.original
+		stored = self.cache.original_b
+		if row is None:
+			(row, stored) = (self.cache.row, self.cache.get_b())
+		if b is None:
+			b = stored
+		a = kernels.sparsify(row)
+		limit = self.options.get(MAX_ITERATIONS) or 1000
+
+		if solver == CG:
+			x = self.conjugate_gradient(a, row[self.node_id], b, limit, solve)
+		elif solver == GAUSS_SEIDEL:
+			if self.colours is None:
+				reach = max([abs(j - self.node_id) for j in a[0]] or [0])
+				self.colours = 1 + collectives.allreduce(self, self.nodes,
+					"reach", reach, max)
+			x = self.relax(a, row[self.node_id], b, limit, self.colours, solve)
+		else:
+			x = self.relax(a, row[self.node_id], b, limit, 1, solve)
+		if x is not None:
+			self.index = self.node_id
+		return x
+
+	def relax(self, a, diagonal, b, limit, colours, solve = 0):
+		"""
+			Jacobi or multicolour Gauss-Seidel iterations. At every step the
+			nodes gather x with their last correction, and the nodes of one
+			colour, by id modulo 'colours', replace x_i by
+			(b_i - sum of a_ij x_j, j != i) / a_ii. With one colour this is
+			Jacobi; with more, every row uses the new values of the colours
+			before its own, which is Gauss-Seidel as long as no two rows of
+			one colour are coupled.
+
+			@type a: (List of Integer, List of Float)
+			@param a: the nonzero elements of the row
+			@type diagonal: Float
+			@param diagonal: the element of the row on the diagonal
+			@type b: Float
+			@param b: the element of b
+			@type limit: Integer
+			@param limit: the largest number of iterations
+			@type colours: Integer
+			@param colours: 1 for Jacobi, or the number of colours of
+				Gauss-Seidel
+			@type solve: Integer
+			@param solve: the number of the re-solve, 0 for the first solve
+			@rtype: Float
+			@return: the element of x, or None if it did not converge
+		"""
+		x = 0.0
+		correction = abs(divide(b, diagonal))
+		initial = None
+		for step in xrange(limit * colours):
+			pairs = collectives.allgather(self, self.nodes,
+				("relax", solve, step),
+				(x, correction), self.node_id)
+			largest = max([pair[1] for pair in pairs])
+			if largest <= TOLERANCE:
+				return x
+			if initial is None:
+				initial = largest
+			if not largest < DIVERGENCE * initial:
+				return None
+
+			if step % colours == self.node_id % colours:
+				xs = [pair[0] for pair in pairs]
+				dx = divide(b - kernels.sparse_dot(a, xs), diagonal)
+				x += dx
+				correction = abs(dx)
+		return None
+
+	def conjugate_gradient(self, a, diagonal, b, limit, solve = 0):
+		"""
+			Conjugate gradient iterations, in the Chronopoulos-Gear form which
+			needs a single allreduce per iteration: the nodes gather the
+			residual r, compute their element of w = A r and reduce r.r, r.w
+			and the largest correction |r_i / a_ii| together.
+
+			@type a: (List of Integer, List of Float)
+			@param a: the nonzero elements of the row
+			@type diagonal: Float
+			@param diagonal: the element of the row on the diagonal
+			@type b: Float
+			@param b: the element of b
+			@type limit: Integer
+			@param limit: the largest number of iterations
+			@type solve: Integer
+			@param solve: the number of the re-solve, 0 for the first solve
+			@rtype: Float
+			@return: the element of x, or None if it did not converge
+		"""
+		(x, r, p, s) = (0.0, b, 0.0, 0.0)
+		(alpha, gamma) = (None, None)
+		initial = None
+		for step in xrange(limit + 1):
+			rs = collectives.allgather(self, self.nodes,
+				("residual", solve, step), r, self.node_id)
+			w = kernels.sparse_dot(a, rs)
+			(new_gamma, delta, largest) = collectives.allreduce(self,
+				self.nodes, ("dots", solve, step),
+				(r * r, r * w, abs(divide(r, diagonal))),
+				lambda u, v: (u[0] + v[0], u[1] + v[1], max(u[2], v[2])))
+			if largest <= TOLERANCE:
+				return x
+			if initial is None:
+				initial = largest
+			if not largest < DIVERGENCE * initial or step == limit:
+				return None
+
+			beta = 0.0
+			if alpha is None:
+				denominator = delta
+			else:
+				beta = quotient(new_gamma, gamma)
+				term = quotient(beta * new_gamma, alpha)
+				if beta is None or term is None:
+					return None
+				denominator = delta - term
+			alpha = quotient(new_gamma, denominator)
+			if alpha is None:
+				return None
+			gamma = new_gamma
+			p = r + beta * p
+			s = w + beta * s
+			x += alpha * p
+			r -= alpha * s
+		return None
+
+	def eliminate(self):
+		"""
+			Eliminates columns from the node's row until the row is chosen as
+			pivot; the row then is row 'index' of the upper triangular matrix.
+
+			The columns are processed in panels of 'panel_width' columns. The
+			pivots of a panel are chosen one column at a time, updating only
+			the panel columns; the chosen rows are then completed by the
+			first pivot of the panel and broadcast together, and every other
+			node applies them to the rest of its row in a single update, or,
+			with lookahead, to the next panel's columns first and to the rest
+			of the row while it takes part in the next pivot search.
+		"""
+		n = self.matrix_size
+		width = self.options.get(PANEL_WIDTH) or 1
+		lookahead = self.options.get(LOOKAHEAD)
+		remaining = self.nodes[:]
+		for start in range(0, n, width):
+			end = min(start + width, n)
+			multipliers = self.factor_panel(start, end, remaining)
+			self.lower.extend(multipliers)
+			winners = [self.nodes[winner] for winner in self.perm[start:end]]
+			if self in winners:
+				self.cache.fetch(n)
+				self.catch_up()
+
+			if self is winners[0]:
+				panel = [(self.pack(row), b)
+					for (row, b) in self.form_panel(start, end, winners)]
+			elif self in winners:
+				self.send(winners[0], PANEL, ("panel", start),
+					(self.index, self.pack(self.cache.row[end:]),
+					self.cache.get_b(), multipliers))
+				panel = None
+			else:
+				panel = None
+			panel = collectives.broadcast(self, remaining, winners[0],
+				("panel", start), panel)
+
+			if self in winners:
+				(row, b) = panel[self.index - start]
+				row = self.unpack(row, n - end)
+				self.cache.put_A_range(start, self.cache.row[start:end] + row,
+					PIVOT)
+				self.cache.put_b(b, PIVOT)
+				return
+
+			stop = n
+			if lookahead:
+				stop = min(end + width, n)
+			self.update_trailing(start, end, multipliers, panel, stop)
+			if stop < n:
+				self.deferred = (stop, end, multipliers, panel)
+			for node in winners:
+				remaining.remove(node)
+
+	def factor_panel(self, start, end, group):
+		"""
+			Chooses the pivots of the columns start..end-1, updating only
+			those columns. At every step the nodes of the group run an argmax
+			allreduce over the current column; the result carries the panel
+			columns of the winning row. Nodes already chosen in this panel
+			keep taking part, with a score that cannot win, so that all of
+			them learn every pivot of the panel.
+
+			@type start: Integer
+			@param start: the first column of the panel
+			@type end: Integer
+			@param end: the column after the panel
+			@type group: List of Node
+			@param group: the nodes not chosen before this panel
+			@rtype: List of Float
+			@return: the multipliers of the pivot rows used on this node's
+				row, until it was chosen as pivot
+		"""
+		self.cache.fetch(end)
+		row = self.cache.row
+		multipliers = []
+		for k in range(start, end):
+			if self.index is None:
+				candidate = (abs(row[k]), self.node_id, row[k:end])
+			else:
+				candidate = (-1, self.node_id, None)
+			(score, winner, segment) = collectives.allreduce(self, group,
+				("argmax", k), candidate, collectives.argmax, self.catch_up)
+			self.perm.append(winner)
+
+			if self.index is not None:
+				continue
+			if winner == self.node_id:
+				self.index = k
+				continue
+
+			factor = 0.0
+			if row[k] != 0 and segment[0] != 0:
+				factor = row[k] / segment[0]
+			multipliers.append(factor)
+			row[k] = 0.0
+			kernels.axpy(-factor, segment, row, k + 1, end, k)
+		return multipliers
+
+	def form_panel(self, start, end, winners):
+		"""
+			Called on the first pivot of a panel: gathers the other pivot
+			rows of the panel, which were only updated within the panel
+			columns, and applies the panel's pivots to the rest of them.
+
+			@type start: Integer
+			@param start: the first column of the panel
+			@type end: Integer
+			@param end: the column after the panel
+			@type winners: List of Node
+			@param winners: the nodes chosen as pivots of the panel, in order
+			@rtype: List of (List of Float, Float)
+			@return: columns end.. and the element of b of each pivot row
+		"""
+		rows = [None] * len(winners)
+		rows[0] = (self.cache.row[end:], self.cache.get_b(), [])
+		for node in winners[1:]:
+			(index, row, b, multipliers) = \
+				self.receive((PANEL,), ("panel", start)).data
+			rows[index - start] = (self.unpack(row, self.matrix_size - end), b,
+				multipliers)
+
+		panel = []
+		for (row, b, multipliers) in rows:
+			row = row[:]
+			for m in range(len(multipliers)):
+				kernels.axpy(-multipliers[m], panel[m][0], row)
+			b -= kernels.dot(multipliers, [pivot_b for (pivot_row, pivot_b)
+				in panel[:len(multipliers)]])
+			panel.append((row, b))
+		return panel
+
+	def update_trailing(self, start, end, multipliers, panel, stop):
+		"""
+			Applies the pivot rows of a panel to the columns end..stop-1 and
+			to the element of b, as a single update, and writes the columns
+			start..stop-1; any deferred update is applied first.
+
+			@type start: Integer
+			@param start: the first column of the panel
+			@type end: Integer
+			@param end: the column after the panel
+			@type multipliers: List of Float
+			@param multipliers: the multipliers of the panel's pivot rows
+			@type panel: List of (List of Float, Float)
+			@param panel: columns end.. and the element of b of the pivot rows
+			@type stop: Integer
+			@param stop: the column after the last updated one
+		"""
+		self.catch_up()
+		self.update_columns(end, stop, end, multipliers, panel)
+		b = self.cache.get_b() - kernels.dot(multipliers,
+			[pivot_b for (pivot_row, pivot_b) in panel])
+		self.cache.put_A_range(start, self.cache.row[start:stop])
+		self.cache.put_b(b)
+
+	def catch_up(self):
+		"""
+			Applies the deferred part of the last panel's update, if any, to
+			the columns after the next panel.
+		"""
+		if self.deferred is None:
+			return
+		(stop, end, multipliers, panel) = self.deferred
+		self.deferred = None
+		self.update_columns(stop, self.matrix_size, end, multipliers, panel)
+		self.cache.put_A_range(stop, self.cache.row[stop:])
+
+	def update_columns(self, lo, hi, end, multipliers, panel):
+		"""
+			Applies the pivot rows of a panel to the columns lo..hi-1 of the
+			node's row, in the cache only.
+
+			@type lo: Integer
+			@param lo: the first updated column, not before 'end'
+			@type hi: Integer
+			@param hi: the column after the last updated one
+			@type end: Integer
+			@param end: the column after the panel, where the panel rows start
+			@type multipliers: List of Float
+			@param multipliers: the multipliers of the panel's pivot rows
+			@type panel: List of (List of Float, Float)
+			@param panel: columns end.. and the element of b of the pivot rows
+		"""
+		self.cache.fetch(hi)
+		axpy = kernels.axpy
+		if self.options.get(SPARSE):
+			axpy = kernels.sparse_axpy
+		for m in range(len(multipliers)):
+			axpy(-multipliers[m], panel[m][0], self.cache.row, lo, hi, end)
+
+	def substitute(self):
+		"""
+			Computes the node's element of x. Back substitution runs as a
+			wavefront: x_j is broadcast to the nodes holding logical rows
+			0..j as soon as it is known, and each of them folds it into the
+			partial sum of its row, so only one subtraction and one division
+			are left when its own turn comes.
+
+			The permutation is only complete on the node holding the last
+			logical row; it is sent along with x_{n-1}, through node 0, to
+			all the nodes.
+
+			@rtype: Float
+			@return: the element of x
+		"""
+		n = self.matrix_size
+		k = self.index
+		row = self.cache.row
+		s = self.cache.get_b()
+
+		last = None
+		if k == n - 1:
+			last = (divide(s, row[k]), self.perm)
+			if self is not self.nodes[0]:
+				self.send(self.nodes[0], X, ("x", k), last)
+		elif self is self.nodes[0]:
+			last = self.receive((X,), ("x", n - 1)).data
+		(x, self.perm) = collectives.broadcast(self, self.nodes, self.nodes[0],
+			("x", n - 1), last)
+		self.logical = [self.nodes[p] for p in self.perm]
+		if k == n - 1:
+			return x
+		return self.back_substitute(s - row[n - 1] * x, "x", n - 2)
+
+	def solve_banded(self):
+		"""
+			Solves a banded system with the band-limited engine, or with the
+			Thomas algorithm if it is tridiagonal and diagonally dominant.
+
+			@rtype: Float
+			@return: the element of x
+		"""
+		bandwidth = self.options.get(BANDWIDTH)
+		if bandwidth:
+			(lower, upper) = (bandwidth, bandwidth)
+		else:
+			(lower, upper, dominant) = self.detect_band()
+			if lower <= 1 and upper <= 1 and dominant and \
+					self.options.get(PRECISION) != SINGLE:
+				return self.thomas(self.cache.get_b())
+
+		self.eliminate_banded(lower, upper)
+		self.perm = collectives.allgather(self, self.nodes, "perm",
+			self.node_id, self.index)
+		self.logical = [self.nodes[p] for p in self.perm]
+		self.reach = lower + upper
+		return self.back_substitute(self.cache.get_b(), "x",
+			self.matrix_size - 1)
+
+	def detect_band(self):
+		"""
+			Finds the bandwidth of the matrix with an allreduce over the
+			nonzero elements of every row.
+
+			@rtype: (Integer, Integer, Boolean)
+			@return: the number of diagonals below and above the main one,
+				and whether the matrix is diagonally dominant
+		"""
+		i = self.node_id
+		row = self.cache.row
+		columns = [j for j in xrange(self.matrix_size) if row[j] != 0] or [i]
+		others = sum([abs(row[j]) for j in columns if j != i], 0.0)
+		value = (max(i - columns[0], 0), max(columns[-1] - i, 0),
+			abs(row[i]) >= others)
+		return collectives.allreduce(self, self.nodes, "band", value,
+			lambda a, b: (max(a[0], b[0]), max(a[1], b[1]), a[2] and b[2]))
+
+	def eliminate_banded(self, lower, upper):
+		"""
+			Band-limited elimination with partial pivoting. Row i has no
+			nonzero element before column i-lower, so it only takes part in
+			the steps after i-lower; at every step the candidates are the
+			lower+1 rows not chosen yet among the rows 0..k+lower, and the
+			pivot row has no nonzero element after column k+lower+upper. The
+			first candidate tells the row entering the band at the next step
+			which rows the candidates are; with no diagonal below the main
+			one, every row is the only candidate of its own step.
+
+			@type lower: Integer
+			@param lower: the number of diagonals below the main one
+			@type upper: Integer
+			@param upper: the number of diagonals above the main one
+		"""
+		n = self.matrix_size
+		i = self.node_id
+		k = max(0, i - lower)
+		if k == 0:
+			group = self.nodes[:lower + 1]
+		elif lower == 0:
+			group = [self]
+		else:
+			group = [self.nodes[j]
+				for j in self.receive((BAND,), ("band", k)).data]
+		self.lower = [0.0] * k
+
+		row = self.cache.row
+		while True:
+			stop = min(k + lower + upper + 1, n)
+			candidate = (abs(row[k]), i, row[k:stop], self.cache.get_b())
+			(score, winner, segment, pivot_b) = collectives.allreduce(self,
+				group, ("argmax", k), candidate, collectives.argmax)
+			if winner == i:
+				self.index = k
+				return
+
+			factor = 0.0
+			if row[k] != 0 and segment[0] != 0:
+				factor = row[k] / segment[0]
+			self.lower.append(factor)
+			row[k] = 0.0
+			kernels.axpy(-factor, segment, row, k + 1, stop, k)
+			self.cache.put_A_range(k, row[k:stop])
+			self.cache.put_b(self.cache.get_b() - factor * pivot_b)
+
+			group = [node for node in group if node.node_id != winner]
+			if k + 1 + lower < n:
+				group.append(self.nodes[k + 1 + lower])
+				if self is group[0]:
+					self.send(group[-1], BAND, ("band", k + 1),
+						[node.node_id for node in group])
+			k += 1
+
+	def thomas(self, b, solve = 0):
+		"""
+			Solves a diagonally dominant tridiagonal system with the Thomas
+			algorithm, without pivoting: the forward sweep passes the reduced
+			super-diagonal element and element of b from every node to the
+			next one, and the backward sweep passes x back. The first solve
+			keeps the sub-diagonal element, the pivot and the reduced
+			super-diagonal element; the next ones only pass b and x.
+
+			@type b: Float or Vector
+			@param b: the element of b
+			@type solve: Integer
+			@param solve: the number of the re-solve, 0 for the first solve
+			@rtype: Float
+			@return: the element of x
+		"""
+		n = self.matrix_size
+		i = self.node_id
+		first = self.tridiagonal is None
+
+		(c_prev, d_prev) = (0.0, 0.0)
+		if i > 0:
+			data = self.receive((THOMAS,), ("thomas", solve, i)).data
+			if first:
+				(c_prev, d_prev) = data
+			else:
+				d_prev = data
+		if first:
+			row = self.cache.row
+			(sub, c) = (0.0, 0.0)
+			if i > 0:
+				sub = row[i - 1]
+			if i < n - 1:
+				c = row[i + 1]
+			pivot = row[i] - sub * c_prev
+			self.tridiagonal = (sub, pivot, divide(c, pivot))
+		(sub, pivot, c) = self.tridiagonal
+		d = divide(b - sub * d_prev, pivot)
+
+		x = d
+		if i < n - 1:
+			self.send(self.nodes[i + 1], THOMAS, ("thomas", solve, i + 1),
+				(c, d) if first else d)
+			x -= c * self.receive((X,), ("x", solve, i)).data
+		if i > 0:
+			self.send(self.nodes[i - 1], X, ("x", solve, i - 1), x)
+		self.index = i
+		return x
+
+	def pack(self, row):
+		"""
+			Prepares a row to be sent to other nodes: in sparse mode only its
+			nonzero elements are sent.
+
+			@type row: List or array of Float
+			@param row: the row
+			@return: the row, or its nonzero elements in sparse mode
+		"""
+		if self.options.get(SPARSE):
+			return kernels.sparsify(row)
+		return row
+
+	def unpack(self, row, length):
+		"""
+			Converts a row received from another node back to a dense row,
+			see pack().
+
+			@param row: the row, as sent
+			@type length: Integer
+			@param length: the number of elements of the row
+			@rtype: List or array of Float
+			@return: the dense row
+		"""
+		if self.options.get(SPARSE):
+			return self.cache.convert(kernels.densify(row, length))
+		return row
+
+	def back_substitute(self, s, tag, top):
+		"""
+			Solves U z = y as a wavefront, once every node knows the
+			permutation: z_j is broadcast by the node holding logical row j
+			to the nodes holding logical rows 0..j, for j from 'top' down;
+			for banded matrices, only to the rows within the band.
+
+			@type s: Float
+			@param s: the node's element of y, minus the terms of the elements
+				of z after 'top'
+			@param tag: identifies the solve; the steps are (tag, j)
+			@type top: Integer
+			@param top: the last element of z still to be broadcast
+			@rtype: Float
+			@return: the node's element of z
+		"""
+		k = self.index
+		row = self.cache.row
+		reach = self.reach
+		for j in range(min(top, k + reach), k, -1):
+			z = collectives.broadcast(self, self.logical[max(j - reach, 0):j + 1],
+				self.logical[j], (tag, j))
+			s -= row[j] * z
+
+		z = divide(s, row[k])
+		collectives.broadcast(self, self.logical[max(k - reach, 0):k + 1], self,
+			(tag, k), z)
+		return z
+
+	def forward_substitute(self, s, tag):
+		"""
+			Solves L y = r as a wavefront: y_j is broadcast by the node
+			holding logical row j to the nodes holding logical rows j..n-1,
+			which subtract it with the multiplier they used for pivot j.
+
+			@type s: Float
+			@param s: the node's element of r
+			@param tag: identifies the solve; the steps are (tag, j)
+			@rtype: Float
+			@return: the node's element of y
+		"""
+		k = self.index
+		for j in range(k):
+			y = collectives.broadcast(self, self.logical[j:], self.logical[j],
+				(tag, j))
+			s -= self.lower[j] * y
+
+		collectives.broadcast(self, self.logical[k:], self, (tag, k), s)
+		return s
+
+	def refine(self, x, b, solve = 0):
+		"""
+			Improves the node's element of x by iterative refinement: at
+			every step the nodes gather x, compute the residual of their
+			original equation in double precision and solve for the
+			correction with the L and U factors.
+
+			@type x: Float
+			@param x: the node's element of x
+			@type b: Float or Vector
+			@param b: the node's element of b
+			@type solve: Integer
+			@param solve: the number of the re-solve, 0 for the first solve
+			@rtype: Float
+			@return: the refined element of x
+		"""
+		n = self.matrix_size
+		for step in range(self.options.get(REFINEMENT_STEPS) or 2):
+			xs = collectives.allgather(self, self.nodes,
+				("gather", solve, step), x, self.index)
+			r = b - kernels.dot(self.cache.original, xs)
+			y = self.forward_substitute(r, ("y", solve, step))
+			x += self.back_substitute(y, ("dx", solve, step), n - 1)
+		return x
 
 	def __str__(self):
 		"""
@@ -119,7 +952,7 @@ class Node:
 			@rtype: String
 			@return: a string containing this node's id
 		"""
-        	return "Node %d" % self.node_id
+		return "Node %d" % self.node_id
 
 
 	def set_datastore(self, datastore):
@@ -131,54 +964,337 @@ class Node:
 			@param datastore: the datastore associated with this node
 		"""
 		self.datastore = datastore
-		# TODO other code
+		self.cache = RowCache(self,
+			self.options.get(CACHE_MODE) == WRITE_THROUGH,
+			self.options.get(PRECISION) == SINGLE,
+			self.options.get(SPARSE))
 
 
 	def set_nodes(self, nodes):
 		"""
-			Informs the current node of the other nodes in the cluster. 
+			Informs the current node of the other nodes in the cluster.
 			Guaranteed to be called before the first call to 'get_x'.
 
 			@type nodes: List of Node
 			@param nodes: a list containing all the nodes in the cluster
 		"""
 		self.nodes = nodes
-		# TODO other code
-		self.sema = Semaphore(value = self.datastore.get_max_pending_requests())
-		self.my_thread = Thread(target = comp)
+		self.my_thread = Thread(target = self.comp, name = str(self))
+		self.datastore.register_thread(self, self.my_thread)
+		self.io = RequestScheduler(self,
+			self.datastore.get_max_pending_requests(),
+			self.options.get(ADAPTIVE_WINDOW))
 
 
 	def get_x(self):
-        	"""
+		"""
 			Computes the x value corresponding to this node. This method is
 			invoked by the tester. This method must block until the result is
 			available.
 
 			@rtype: (Float, Integer)
 			@return: the x value and the index of this variable in the solution
-				vector
+				vector; with several right-hand sides, the list of the x
+				values of all of them
+		"""
+		self.io.start()
+		self.my_thread.start()
+		self.result_ready.wait()
+		return self.result
+
+
+	def solve(self, b):
 		"""
-		pass
-		# TODO other code
+			Solves the system again for a new b, with the factors computed by
+			get_x(), which must have returned. This method is invoked by the
+			tester, on every node, with the node's element of the new b;
+			the calls of a node must be made one after the other, and all the
+			nodes must solve for the same sequence of b vectors. This method
+			blocks until the result is available.
+
+			@type b: Float or Vector
+			@param b: the element of b of row 'node_id'
+			@rtype: (Float, Integer)
+			@return: the x value and the index of this variable in the
+				solution vector, as returned by get_x()
+		"""
+		self.solves += 1
+		self.result_ready.clear()
+		self.send(self, SOLVE, ("solve", self.solves), b)
+		self.result_ready.wait()
+		return self.result
+
+
+	def get_stats(self):
+		"""
+			Returns the statistics of the node's request window. This method
+			is invoked by the tester after shutdown().
+
+			@rtype: Dictionary
+			@return: the statistics, see WindowController.summary
+		"""
+		return self.io.controller.summary()
 
 
 	def shutdown(self):
-        	"""
+		"""
 			Instructs the node to shutdown (terminate all threads). This method
-            		is invoked by the tester. This method must block until all the
-            		threads started by this node terminate.
-        	"""
-		pass
-		# TODO other code
+			is invoked by the tester. This method must block until all the
+			threads started by this node terminate.
+		"""
+		if self.my_thread.is_alive():
+			self.send(self, STOP, None)
+		if self.my_thread.ident is not None:
+			self.my_thread.join()
+		self.io.stop()
+
+def divide(s, pivot):
+	"""
+		Divides by a pivot, giving NaN for the zero pivots of singular
+		matrices instead of failing.
+	"""
+	if pivot == 0:
+		return s * float("nan")
+	return s / pivot
+
+def quotient(a, b):
+	"""
+		Divides element by element, for Floats or Vectors of right-hand
+		sides, taking 0 / 0 as 0: the columns of a Vector already solved
+		exactly then keep a zero step instead of failing.
+
+		@rtype: Float or Vector
+		@return: the quotient, or None if a nonzero element is divided by
+			zero
+	"""
+	op = lambda u, v: 0.0 if u == 0 and v == 0 else u / v
+	try:
+		if hasattr(a, "combine"):
+			return a.combine(b, op)
+		if hasattr(b, "combine"):
+			return b.combine(a, lambda v, u: op(u, v))
+		return op(a, b)
+	except ZeroDivisionError:
+		return None
 
 class Message:
+	"""
+		Message exchanged by the nodes through their queues.
+	"""
 
-	def __init__(self, tip, node):
+	def __init__(self, tip, node, step = None, data = None):
 		"""
 			Constructor.
+
+			@type tip: Integer
+			@param tip: the message type
+			@type node: Node
+			@param node: the sender
+			@type step: Integer
+			@param step: the elimination step the message belongs to
+			@param data: the message contents
 		"""
 		self.tip = tip
 		self.node = node
+		self.step = step
+		self.data = data
+
+
+class RowCache:
+	"""
+		Node-local copy of the row of A and of the element of b stored in the
+		node's datastore. The row is read once, as a list of doubles or, in
+		single precision, as an array of floats; updates are kept in the cache
+		and only the modified elements are written back by flush(). In
+		write-through mode every update is also sent to the datastore
+		immediately, without waiting for it; flush() waits for all of them.
+		This is slower but keeps the datastore up to date.
+	"""
+
+	def __init__(self, node, write_through = False, single = False,
+		sparse = False):
+		"""
+			Constructor.
+
+			@type node: Node
+			@param node: the node owning the cache; its accessors are used
+				for all the datastore requests
+			@type write_through: Boolean
+			@param write_through: True to write every update immediately
+			@type single: Boolean
+			@param single: True to keep the row in single precision; the
+				row and b as read are then also kept, in 'original' and
+				'original_b'
+			@type sparse: Boolean
+			@param sparse: True to transfer only the nonzero elements of the
+				row
+		"""
+		self.node = node
+		self.write_through = write_through
+		self.single = single
+		self.sparse = sparse
+		self.row = None
+		self.b = None
+		self.original = None
+		self.original_b = None
+		self.loading = []
+		self.writes = []
+		self.dirty = set()
+		self.b_dirty = False
+
+	def load(self, prefetch = None):
+		"""
+			Reads the whole row and the element of b, in a single request.
+			Must be called from a thread registered with the datastore.
+
+			@type prefetch: Integer
+			@param prefetch: if given, the row is read asynchronously instead,
+				in two requests: the first 'prefetch' columns and the element
+				of b, then the other columns; fetch() waits for them
+		"""
+		n = self.node.matrix_size
+		if not prefetch or prefetch >= n:
+			if self.sparse:
+				(row, b) = self.node.get_sparse_row(0, n, PIVOT)
+				row = kernels.densify(row, n)
+			else:
+				(row, b) = self.node.get_row(0, n, PIVOT)
+			self.loaded(0, row, b)
+			return
+
+		self.row = self.convert([0.0] * n)
+		if self.single:
+			self.original = [0.0] * n
+		if self.sparse:
+			self.loading = [(0, prefetch,
+				self.node.submit_get_sparse_row(0, prefetch, PIVOT)),
+				(prefetch, n, self.node.submit_get_sparse_row(prefetch, n))]
+		else:
+			self.loading = [
+				(0, prefetch, self.node.submit_get_row(0, prefetch, PIVOT)),
+				(prefetch, n, self.node.submit_get_A_range(prefetch, n))]
+
+	def fetch(self, stop):
+		"""
+			Waits until the columns before 'stop' and the element of b are
+			loaded. Must be called before reading 'row' directly.
+
+			@type stop: Integer
+			@param stop: the column after the last needed one
+		"""
+		while len(self.loading) > 0 and self.loading[0][0] < stop:
+			(start, end, future) = self.loading.pop(0)
+			values = future.result()
+			b = None
+			if self.sparse:
+				(values, b) = values
+				values = kernels.densify(values, end - start, start)
+			elif start == 0:
+				(values, b) = values
+			if start != 0:
+				b = None
+			self.loaded(start, values, b)
+
+	def loaded(self, start, values, b = None):
+		"""
+			Stores columns read from the datastore, starting with column
+			'start', and the element of b if it was read with them.
+		"""
+		if self.row is None:
+			self.row = self.convert(values)
+			if self.single:
+				self.original = list(values)
+		else:
+			self.row[start:start + len(values)] = self.convert(values)
+			if self.single:
+				self.original[start:start + len(values)] = values
+		if b is not None:
+			self.b = b
+			self.original_b = b
+
+	def convert(self, values):
+		"""
+			Converts values to the representation of the row.
+
+			@type values: List of Float
+			@param values: the values
+			@rtype: List or array of Float
+			@return: the values, as an array of floats in single precision
+		"""
+		if self.single:
+			return array("f", values)
+		return list(values)
+
+	def get_A(self, column):
+		self.fetch(column + 1)
+		return self.row[column]
+
+	def put_A(self, column, A, priority = TRAILING):
+		self.row[column] = A
+		if self.write_through:
+			self.writes.append(self.node.submit_put_A(column, A, priority))
+		else:
+			self.dirty.add(column)
+
+	def put_A_range(self, start, values, priority = TRAILING):
+		self.row[start:start + len(values)] = kernels.like(self.row, values)
+		if self.write_through and self.sparse:
+			(indices, nonzeros) = kernels.sparsify(values, start)
+			self.writes.append(self.node.submit_put_sparse_row(start,
+				start + len(values), indices, nonzeros, None, priority))
+		elif self.write_through:
+			self.writes.append(
+				self.node.submit_put_A_range(start, values, priority))
+		else:
+			self.dirty.update(range(start, start + len(values)))
+
+	def get_b(self):
+		self.fetch(1)
+		return self.b
+
+	def put_b(self, b, priority = TRAILING):
+		self.b = b
+		if self.write_through:
+			self.writes.append(self.node.submit_put_b(b, priority))
+		else:
+			self.b_dirty = True
+
+	def flush(self):
+		"""
+			Writes the modified elements back to the datastore, one request
+			for each run of consecutive modified columns; the element of b is
+			sent along with the last run. In write-through mode, waits for
+			the pending writes instead. In sparse mode the nonzero elements
+			between the first and the last modified column are sent in a
+			single request, with b.
+		"""
+		self.fetch(self.node.matrix_size)
+		wait_all(self.writes)
+		self.writes = []
+		if self.sparse and len(self.dirty) > 0:
+			(start, stop) = (min(self.dirty), max(self.dirty) + 1)
+			(indices, values) = kernels.sparsify(self.row[start:stop], start)
+			self.node.put_sparse_row(start, stop, indices, values,
+				self.b if self.b_dirty else None)
+			self.dirty = set()
+			self.b_dirty = False
+
+		runs = []
+		for column in sorted(self.dirty):
+			if len(runs) > 0 and runs[-1][1] == column:
+				runs[-1][1] = column + 1
+			else:
+				runs.append([column, column + 1])
+
+		for i in range(len(runs)):
+			(start, stop) = runs[i]
+			if i == len(runs) - 1 and self.b_dirty:
+				self.node.put_row(start, self.row[start:stop], self.b)
+				self.b_dirty = False
+			else:
+				self.node.put_A_range(start, self.row[start:stop])
+		if self.b_dirty:
+			self.node.put_b(self.b)
 
-	def add_line(self, line):
-		self.line = line
+		self.dirty = set()
+		self.b_dirty = False
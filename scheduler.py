@@ -0,0 +1,351 @@
+"""
+    This module provides the request scheduler of the nodes. Every node sends
+    its datastore requests through a scheduler, which keeps at most a window
+    of them in flight and, when the window is full, sends the queued
+    requests on the critical path of the elimination first. The window is
+    either the datastore's limit or chosen adaptively from the observed
+    request latencies.
+
+    Computer Systems Architecture Course
+    Assignment 1 - Cluster Activity Simulation
+    March 2014
+"""
+
+
+from threading import Condition, Thread
+
+from datastore import Future
+
+
+# Request classes, in the order in which they are served
+PIVOT = 0       # reads and writes the other nodes are waiting for: the
+                # columns of the next pivot search and the final pivot rows
+TRAILING = 1    # trailing updates, updates of b and the rest of the row
+
+
+class Request:
+    """
+        Datastore request waiting in, or sent by, a scheduler.
+    """
+
+    def __init__(self, operation, args, priority, sequence, spans):
+        """
+            Constructor.
+
+            @type operation: String
+            @param operation: the name of the datastore method
+            @type args: Tuple
+            @param args: the arguments of the method, after the node
+            @type priority: Integer
+            @param priority: the request class, PIVOT or TRAILING
+            @type sequence: Integer
+            @param sequence: the submission order of the request
+            @type spans: List of (Integer, Integer)
+            @param spans: the ranges of columns touched by the request; b is
+                column 'matrix_size'
+        """
+        self.operation = operation
+        self.args = args
+        self.priority = priority
+        self.sequence = sequence
+        self.spans = spans
+        self.write = operation.startswith("put")
+        self.sent = None
+        self.future = Future()
+
+
+    def conflicts(self, other):
+        """
+            Checks whether the order of two requests matters, i.e. whether
+            they touch a common element and at least one of them writes it.
+
+            @type other: Request
+            @param other: the other request
+            @rtype: Boolean
+            @return: True, if the requests must be served in their order
+        """
+        if not self.write and not other.write:
+            return False
+        for (start, stop) in self.spans:
+            for (other_start, other_stop) in other.spans:
+                if start < other_stop and other_start < stop:
+                    return True
+        return False
+
+
+class WindowController:
+    """
+        Chooses the number of requests a scheduler keeps in flight. A fixed
+        window is the datastore's limit. An adaptive window starts at one
+        request and grows by one for every completed request (slow start),
+        up to the limit, until the first backoff; after that it grows by one
+        request per window of completed requests. A failed request, or one
+        taking more than four deviations above the smoothed latency, halves
+        the window, at most once per window of completed requests.
+    """
+
+    def __init__(self, limit, adaptive=False):
+        """
+            Constructor.
+
+            @type limit: Integer
+            @param limit: the maximum number of requests in flight supported
+                by the datastore; 0 for unlimited
+            @type adaptive: Boolean
+            @param adaptive: True to adapt the window, False to use the limit
+        """
+        self.limit = limit
+        self.adaptive = adaptive
+        self.window = 1.0 if adaptive else float(limit)
+        self.threshold = None
+        self.latency = None
+        self.deviation = 0.0
+        self.since_backoff = 0
+        self.backoffs = 0
+        self.completions = 0
+        self.window_total = 0.0
+        self.window_max = self.window
+
+
+    def size(self):
+        """
+            Returns the current window.
+
+            @rtype: Integer
+            @return: the number of requests that may be in flight; 0 for
+                unlimited
+        """
+        return int(self.window)
+
+
+    def completed(self, latency, failed=False):
+        """
+            Updates the window after a request completes.
+
+            @type latency: Float
+            @param latency: the time the request took, from being sent to the
+                datastore until its completion
+            @type failed: Boolean
+            @param failed: True if the request failed
+        """
+        self.completions += 1
+        self.window_total += self.window
+        if not self.adaptive:
+            return
+
+        inflated = False
+        if self.latency is None:
+            self.latency = latency
+            self.deviation = latency / 2
+        else:
+            inflated = latency > self.latency + 4 * self.deviation
+            self.deviation = 0.75 * self.deviation + \
+                0.25 * abs(latency - self.latency)
+            self.latency = 0.875 * self.latency + 0.125 * latency
+
+        self.since_backoff += 1
+        if (failed or inflated) and self.since_backoff >= self.window:
+            self.threshold = max(self.window / 2, 1.0)
+            self.window = self.threshold
+            self.since_backoff = 0
+            self.backoffs += 1
+        elif self.threshold is None:
+            self.window += 1
+        else:
+            self.window += 1 / self.window
+        if self.limit != 0:
+            self.window = min(self.window, self.limit)
+        self.window_max = max(self.window_max, self.window)
+
+
+    def summary(self):
+        """
+            Returns the window statistics.
+
+            @rtype: Dictionary
+            @return: the datastore limit, whether the window is adaptive, the
+                final, mean and largest window and the number of backoffs
+        """
+        mean = self.window
+        if self.completions > 0:
+            mean = self.window_total / self.completions
+        return {"limit": self.limit, "adaptive": bool(self.adaptive),
+            "window": self.size(), "window_mean": mean,
+            "window_max": int(self.window_max), "backoffs": self.backoffs}
+
+
+class RequestScheduler:
+    """
+        Sends a node's datastore requests from a dedicated thread, registered
+        with the node's datastore. Queued requests are sent by class, then in
+        submission order; a request is held back while an earlier request
+        touching the same elements is queued or in flight, so the datastore
+        sees the writes of the node in the order they were made.
+    """
+
+    def __init__(self, node, window, adaptive=False):
+        """
+            Constructor.
+
+            @type node: Node
+            @param node: the node whose requests are scheduled
+            @type window: Integer
+            @param window: the maximum number of requests in flight; 0 for
+                unlimited
+            @type adaptive: Boolean
+            @param adaptive: True to choose the window from the observed
+                latencies, up to 'window'; see WindowController
+        """
+        self.node = node
+        self.controller = WindowController(window, adaptive)
+        self.queue = []
+        self.in_flight = []
+        self.sequence = 0
+        self.running = False
+        self.condition = Condition()
+        self.thread = Thread(target=self.__run, name="%s scheduler" % node)
+        self.node.datastore.register_thread(self.node, self.thread)
+
+
+    def submit(self, operation, args, priority=TRAILING):
+        """
+            Queues a datastore request.
+
+            @type operation: String
+            @param operation: the name of the datastore method, e.g. 'get_row'
+            @type args: Tuple
+            @param args: the arguments of the method, after the node
+            @type priority: Integer
+            @param priority: the request class, PIVOT or TRAILING
+            @rtype: Future
+            @return: the pending result of the request
+        """
+        with self.condition:
+            request = Request(operation, args, priority, self.sequence,
+                self.spans(operation, args))
+            self.sequence += 1
+            self.queue.append(request)
+            self.condition.notify()
+        return request.future
+
+
+    def spans(self, operation, args):
+        """
+            Returns the ranges of columns touched by a request.
+
+            @type operation: String
+            @param operation: the name of the datastore method
+            @type args: Tuple
+            @param args: the arguments of the method, after the node
+            @rtype: List of (Integer, Integer)
+            @return: the ranges; b is column 'matrix_size'
+        """
+        b = (self.node.matrix_size, self.node.matrix_size + 1)
+        if operation in ("get_A", "put_A"):
+            return [(args[0], args[0] + 1)]
+        if operation in ("get_b", "put_b"):
+            return [b]
+        if operation == "get_A_range":
+            return [(args[0], args[1])]
+        if operation == "put_A_range":
+            return [(args[0], args[0] + len(args[1]))]
+        if operation == "get_row":
+            return [(args[0], args[1]), b]
+        if operation == "put_row":
+            return [(args[0], args[0] + len(args[1])), b]
+        if operation == "get_sparse_row":
+            return [(args[0], args[1]), b]
+        if operation == "put_sparse_row":
+            if args[4] is None:
+                return [(args[0], args[1])]
+            return [(args[0], args[1]), b]
+        raise ValueError("unknown datastore operation '%s'" % operation)
+
+
+    def start(self):
+        """
+            Starts the scheduler thread.
+        """
+        self.running = True
+        self.thread.start()
+
+
+    def stop(self):
+        """
+            Stops the scheduler thread; requests still queued are not sent.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread.ident is not None:
+            self.thread.join()
+
+
+    def __next(self):
+        """
+            Chooses the next request to send. Must be called with the
+            condition held.
+
+            @rtype: Request
+            @return: the request, or None if none can be sent now
+        """
+        window = self.controller.size()
+        if window != 0 and len(self.in_flight) >= window:
+            return None
+
+        best = None
+        for request in self.queue:
+            if best is not None and (request.priority, request.sequence) > \
+                    (best.priority, best.sequence):
+                continue
+            blocked = False
+            for other in self.in_flight + self.queue:
+                if other is not request and \
+                        (other in self.in_flight or
+                            other.sequence < request.sequence) and \
+                        request.conflicts(other):
+                    blocked = True
+                    break
+            if not blocked:
+                best = request
+        return best
+
+
+    def __run(self):
+        """
+            Body of the scheduler thread.
+        """
+        while True:
+            with self.condition:
+                request = self.__next()
+                while self.running and request is None:
+                    self.condition.wait()
+                    request = self.__next()
+                if not self.running:
+                    return
+                self.queue.remove(request)
+                self.in_flight.append(request)
+
+            submit = getattr(self.node.datastore, "submit_" + request.operation)
+            request.sent = self.node.datastore.get_time()
+            try:
+                future = submit(self.node, *request.args,
+                    priority=request.priority)
+            except Exception, err:
+                self.__complete(request, None, err)
+                continue
+            future.add_done_callback(lambda future, request=request:
+                self.__complete(request, future.value, future.error))
+
+
+    def __complete(self, request, value, error):
+        """
+            Frees the window slot of a completed request, updates the window
+            and passes the result on.
+        """
+        latency = self.node.datastore.get_time() - request.sent
+        with self.condition:
+            self.in_flight.remove(request)
+            self.controller.completed(latency, error is not None)
+            self.condition.notify()
+        request.future.set_result(value, error)
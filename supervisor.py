@@ -14,6 +14,8 @@
 
 from threading import current_thread, enumerate, Lock
 
+from datastore import DatastoreStats
+
 
 class Supervisor:
     """
@@ -29,8 +31,11 @@ class Supervisor:
         self.datastore_node_lock = Lock()
         self.banned_threads = set()
         self.banned_threads_lock = Lock()
+        self.datastore_threads = set()
+        self.datastore_threads_lock = Lock()
         self.node_threads = {}
         self.node_threads_lock = Lock()
+        self.thread_node = {}
         self.messages = []
         self.messages_lock = Lock()
 
@@ -50,6 +55,8 @@ class Supervisor:
             self.datastore_node[datastore] = node
 
         with self.node_threads_lock:
+            for thread in self.node_threads.get(node, ()):
+                del self.thread_node[thread]
             self.node_threads[node] = set()
 
 
@@ -91,14 +98,16 @@ datastore owned by node '%s'" % (str(node), str(thread),
                 return
 
         with self.node_threads_lock:
-            for n, threads in self.node_threads.items():
-                if n != node and thread in threads:
-                    #ERROR thread registered with multiple nodes
-                    self.report("node '%s' is trying to register thread '%s' \
-which is already registered by node '%s'" % (str(node), str(thread), str(n)))
-                    return
+            owner = self.thread_node.get(thread, node)
+            if owner != node:
+                #ERROR thread registered with multiple nodes
+                self.report("node '%s' is trying to register thread '%s' \
+which is already registered by node '%s'" % (str(node), str(thread),
+                    str(owner)))
+                return
 
             self.node_threads[node].add(thread)
+            self.thread_node[thread] = node
 
 
     def register_banned_thread(self, thread):
@@ -115,11 +124,29 @@ which is already registered by node '%s'" % (str(node), str(thread), str(n)))
             self.banned_threads.add(thread)
 
 
+    def register_datastore_thread(self, thread):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Registers a thread started by a datastore to serve asynchronous
+            requests. These threads belong to the datastores, not to the nodes,
+            and exit on their own once there are no more queued requests.
+
+            @type thread: Thread
+            @param thread: the thread
+        """
+        with self.datastore_threads_lock:
+            self.datastore_threads.add(thread)
+
+
     def check_access(self, datastore, node, thread):
         """
             !!! This is not part of the assignment API, do not call it !!!
 
-            Checks a datastore access.
+            Checks a datastore access. Accesses from threads registered with
+            the datastore are validated with two dictionary lookups, which
+            are atomic and need no lock; the locks are only needed to find
+            out which rule an invalid access breaks.
 
             @type datastore: Datastore
             @param datastore: the accessed datastore
@@ -128,6 +155,10 @@ which is already registered by node '%s'" % (str(node), str(thread), str(n)))
             @type thread: Thread
             @param thread: the thread from which the access is attempted
         """
+        if self.thread_node.get(thread) is node and \
+                self.datastore_node.get(datastore) is node:
+            return
+
         with self.node_threads_lock:
             if node not in self.node_threads:
                 #ERROR: called by unregistered node
@@ -162,17 +193,19 @@ node '%s' from unregistered thread '%s'" % (str(node),
             with self.banned_threads_lock:
                 if thread in self.banned_threads:
                     continue
+            with self.datastore_threads_lock:
+                if thread in self.datastore_threads:
+                    continue
             with self.node_threads_lock:
-                for node, threads in self.node_threads.items():
-                    if thread in threads:
-                        #ERROR: registered thread did not terminate
-                        self.report("thread '%s' registered with datastore \
+                registered = thread in self.thread_node
+                node = self.thread_node.get(thread)
+            if registered:
+                #ERROR: registered thread did not terminate
+                self.report("thread '%s' registered with datastore \
 of node '%s' did not terminate" % (str(thread), str(node)))
-                        break
-                else:
-                    self.report("thread '%s' not registered with any datastore \
+            else:
+                self.report("thread '%s' not registered with any datastore \
 did not terminate" % str(thread))
-                continue
 
     def check_bonus(self):
         """
@@ -195,6 +228,28 @@ did not terminate" % str(thread))
         return True
 
 
+    def summary(self):
+        """
+            !!! This is not part of the assignment API, do not call it !!!
+
+            Gathers the performance counters of all the registered datastores.
+
+            @rtype: Dictionary
+            @return: the counters of each node's datastore, by node name, and
+                the counters of all the datastores together
+        """
+        with self.datastore_node_lock:
+            datastore_node = self.datastore_node.items()
+
+        nodes = {}
+        total = DatastoreStats(0)
+        for datastore, node in datastore_node:
+            nodes[str(node)] = datastore.get_stats().summary()
+            total.merge(datastore.get_stats())
+
+        return {"nodes": nodes, "total": total.summary()}
+
+
     def report(self, message):
         """
             !!! This is not part of the assignment API, do not call it !!!
@@ -14,11 +14,18 @@ import sys
 import os
 import re
 import getopt
+import json
+import time
+from array import array
 from threading import *
 
+from clock import VirtualClock
 from supervisor import Supervisor
 from node import Node
-from datastore import Datastore
+from datastore import Datastore, ADMISSION_REPORT, ADMISSION_FIFO, \
+    ADMISSION_PRIORITY
+from latency import create_latency_model, StragglerLatency, LATENCY_MODELS
+from matrix import Matrix, SparseMatrix, SparseRow, Vector
 from util import *
 
 #DEBUG = True
@@ -29,21 +36,33 @@ class Tester:
     """ Generates test scenarios and simulates the users and front-end-processors
         of a cluster, which send jobs to the computational and storage nodes.
     """
-    def __init__(self, output_filename):
+    def __init__(self, output_filename, stats_filename = None):
         """
             Constructor.
             @type output_filename: String
             @param output_filename: the file in which the tester logs results
+            @type stats_filename: String
+            @param stats_filename: the file in which the tester logs the
+                datastore statistics of each iteration, as JSON lines; '-' for
+                the standard output, None to disable
         """
         self.output_filename = output_filename
+        self.stats_filename = stats_filename
         
         self.test_generator = TestGenerator()    
         
         self.result_lock = Lock()
         self.result = {}
+        self.resolved = {}
+        self.solved_at = {}
+        self.streamed_at = {}
+        self.resolve_count = 0
+        self.resolve_time = 0.0
+        self.delays = None
         
         self.passed_tests = 0
         self.bonus = None
+        self.makespan = 0.0
         
         self.finished_output_lock = Lock()
         self.finished_output = False       
@@ -71,8 +90,19 @@ class Tester:
 
         print start_test_msg % test[TEST_NAME]
 
+        wall_time = time.time()
         for i in range(times):
             self.start_test(test, i + 1, times, t)
+        wall_time = time.time() - wall_time
+
+        msg = test_time_msg % (test[TEST_NAME], wall_time)
+        if test[VIRTUAL_TIME]:
+            msg = msg + test_makespan_msg % self.makespan
+        if self.resolve_count > 0:
+            msg = msg + test_resolve_msg % (self.resolve_count,
+                self.resolve_time,
+                self.resolve_count / max(self.resolve_time, 1e-9))
+        print msg
 
         print end_test_msg % test[TEST_NAME]
 
@@ -127,6 +157,13 @@ class Tester:
         supervisor.register_banned_thread(timer)
         supervisor.register_banned_thread(current_thread())
 
+        # datastore delays only advance a simulated time in virtual time mode
+        clock = None
+        if test[VIRTUAL_TIME]:
+            clock = VirtualClock()
+            clock.start()
+            supervisor.register_banned_thread(clock.thread)
+
         if test[MAT_SIZE] != test[NUM_NODES]:
             print "Wrong test format, matrix size must be the same as the\
                     number of nodes"
@@ -138,18 +175,24 @@ class Tester:
         datastores = [] 
         
         n = test[MAT_SIZE] # NUM_NODES = MAT_SIZE !
+        node_options = dict((param, test[param]) for param in NODE_PARAMS)
         for i in range(n):
             requests = 0
             if test[MAX_PENDING_REQUESTS] != 0:
                 requests = self.test_generator.rand_gen.randint(1, test[MAX_PENDING_REQUESTS])
-            datastores.append(Datastore(test[A][i][:],     # matrix row
+            latency_model = self.create_latency_model(test, i)
+            datastores.append(Datastore(test[A][i],     # copy-on-write or sparse row
                                         test[B][i],     # vector element
                                         requests,
                                         test[MIN_DATASTORE_DELAY],
                                         test[MAX_DATASTORE_DELAY],
                                         test[SEED_DS],
-                                        supervisor))
-            nodes.append(Node(i, n))
+                                        supervisor,
+                                        test[TRANSFER_DATASTORE_DELAY],
+                                        clock,
+                                        latency_model,
+                                        test[ADMISSION] or ADMISSION_REPORT))
+            nodes.append(Node(i, n, node_options))
             supervisor.register_node(datastores[-1], nodes[-1])
 
         for node in nodes:
@@ -159,24 +202,45 @@ class Tester:
             node.set_nodes(nodes[:])
 
         self.result = {}
+        self.resolved = {}
+        self.solved_at = {}
+        self.streamed_at = {}
 
         # sends tasks to nodes 
         # we need threads because get_x() is blocking
 
         threads = []
         for node in nodes:
-            threads.append(Thread(target=Tester.start_node, args=(self, node)))
+            threads.append(Thread(target=Tester.start_node,
+                args=(self, node, test)))
             supervisor.register_banned_thread(threads[-1])
             threads[-1].start()
             
         for t in threads:
             t.join()
 
+        # the re-solves need all the nodes, so the stream starts when the
+        # last node returns from get_x()
+        if test[STREAM]:
+            self.resolve_count += len(test[STREAM])
+            self.resolve_time += max(self.streamed_at.values()) - \
+                max(self.solved_at.values())
+
         for node in nodes:
             node.shutdown()
 
+        if clock is not None:
+            self.makespan += clock.now()
+            clock.stop()
+
         supervisor.check_termination()
 
+        if self.stats_filename:
+            summary = supervisor.summary()
+            for node in nodes:
+                summary["nodes"][str(node)]["window"] = node.get_stats()
+            self.write_stats(test, iteration, summary)
+
         if self.bonus is None:
             self.bonus = supervisor.check_bonus()
         else:
@@ -184,6 +248,7 @@ class Tester:
        
         errors = supervisor.status()
         errors.extend(self.check_result(test))
+        errors.extend(self.check_delays(supervisor))
 
         if len(errors) == 0:
             self.passed_tests += 1
@@ -194,16 +259,75 @@ class Tester:
                 self.print_error(error)
 
                         
-    def start_node(self, node):
+    def write_stats(self, test, iteration, summary):
         """
-            Sends a task to a cluster's node and checks the result.
+            Logs the datastore statistics gathered in an iteration.
+
+            @type test: a dictionary, its keys are defined in util.py
+            @param test: the test parameters
+            @type iteration: Integer
+            @param iteration: the index of the iteration
+            @type summary: Dictionary
+            @param summary: the statistics, as returned by Supervisor.summary
+        """
+        summary["test"] = test[TEST_NAME]
+        summary["iteration"] = iteration
+        line = json.dumps(summary, sort_keys=True)
+
+        if self.stats_filename == "-":
+            print line
+        else:
+            out_file = open(self.stats_filename, "a")
+            out_file.write(line + "\n")
+            out_file.close()
+
+
+    def create_latency_model(self, test, index):
+        """
+            Creates the latency model of a datastore, as chosen by the test.
+            The datastores chosen as stragglers when the test was loaded are
+            slowed down by a factor of 'straggler_slowdown'.
+
+            @type test: a dictionary, its keys are defined in util.py
+            @param test: the test parameters
+            @type index: Integer
+            @param index: the index of the node owning the datastore
+
+            @rtype: LatencyModel
+            @return: the latency model of the datastore
+        """
+        model = create_latency_model(test[LATENCY_MODEL],
+                                     test[MIN_DATASTORE_DELAY],
+                                     test[MAX_DATASTORE_DELAY],
+                                     test[SEED_DS],
+                                     test[TRANSFER_DATASTORE_DELAY],
+                                     test[LATENCY_SIGMA] or 1.0)
+        if index in test[STRAGGLERS]:
+            model = StragglerLatency(model, test[STRAGGLER_SLOWDOWN] or 10.0)
+        return model
+
+
+    def start_node(self, node, test):
+        """
+            Sends a task to a cluster's node and checks the result, then
+            streams the b vectors the test solves again with the same matrix.
 
             @type node: Node
             @param node: the node to which to send the task
+            @type test: a dictionary, its keys are defined in util.py
+            @param test: the test parameters
         """
         result = node.get_x()
         with self.result_lock:
             self.result[node] = result
+            self.solved_at[node] = time.time()
+
+        results = []
+        for (x, b) in test[STREAM] or []:
+            results.append(node.solve(b[node.node_id]))
+        with self.result_lock:
+            self.resolved[node] = results
+            self.streamed_at[node] = time.time()
 
 
     def check_result(self, test):
@@ -217,17 +341,59 @@ class Tester:
             @type Boolean
             @return True if the result is valid, False otherwise
         """
-        test[X] = [round(x,3) for x in test[X]]
-        result = [None for x in test[X]]
-        for node, ans in self.result.items():
+        errors = self.check_solution(test[X], self.result)
+        for k in range(len(test[STREAM] or [])):
+            answers = dict((node, results[k])
+                for (node, results) in self.resolved.items())
+            errors.extend(["re-solve %d: %s" % (k + 1, error) for error in
+                self.check_solution(test[STREAM][k][0], answers)])
+        return errors
+
+    def check_delays(self, supervisor):
+        """
+            Checks that the datastore requests of each node took the same
+            times as in the first iteration; the latency models draw the
+            delays from seeded streams, so the runs of a test must not differ.
+
+            @type supervisor: Supervisor
+            @param supervisor: the supervisor of the datastores of this
+                iteration
+
+            @rtype: List of String
+            @return: the errors; empty if the delays are the same
+        """
+        delays = dict((node, stats["operations"]) for (node, stats) in
+            supervisor.summary()["nodes"].items())
+        if self.delays is None:
+            self.delays = delays
+            return []
+        return ["datastore delays of node '%s' differ from the first \
+iteration" % node for node in sorted(delays)
+            if delays[node] != self.delays.get(node)]
+
+    def check_solution(self, expected, answers):
+        """
+            Checks the results returned by the nodes for one solution.
+
+            @type expected: List
+            @param expected: the expected x vector
+            @type answers: Dictionary
+            @param answers: the (x, index) pair returned by each node
+
+            @rtype: List of String
+            @return: the errors; empty if the result is valid
+        """
+        expected = [rounded(x) for x in expected]
+        result = [None for x in expected]
+        for node, ans in answers.items():
             try:
                 (x, index) = ans
-                result[index] = round(x, 3)
+                result[index] = rounded(x)
             except Exception, err:
                 return ["exception '%s' while checking result returned by \
 node '%s'" % (str(err), str(node))]
-        if result != test[X]:
-            return ["returned: %s" % str(result), "expected: %s" % str(test[X])]
+        if result != expected:
+            return ["returned: %s" % str(result), "expected: %s" % str(expected)]
         return []
  
     def print_error(self, error_msg):
@@ -258,7 +424,19 @@ class TestGenerator:
        
         self.params_names = [NUM_NODES, MAT_SIZE, TEST_NAME, TIMEOUT_PERIOD, 
                             MAT_FILE, SEED_DS, SEED_MAT, MIN_DATASTORE_DELAY,  
-                            MAX_DATASTORE_DELAY, MAX_PENDING_REQUESTS, BONUS, A, X, B]
+                            MAX_DATASTORE_DELAY, MAX_PENDING_REQUESTS,
+                            TRANSFER_DATASTORE_DELAY, VIRTUAL_TIME,
+                            LATENCY_MODEL, LATENCY_SIGMA, STRAGGLER_FRACTION,
+                            STRAGGLER_SLOWDOWN, ADMISSION, DENSITY, BAND,
+                            SYMMETRIC, RHS, RESOLVES, BONUS,
+                            A, X, B, STREAM, STRAGGLERS] + \
+                            NODE_PARAMS
+        # the accepted values of the string parameters that have a choice
+        self.params_values = {LATENCY_MODEL: LATENCY_MODELS,
+            ADMISSION: (ADMISSION_REPORT, ADMISSION_FIFO, ADMISSION_PRIORITY),
+            SOLVER: (JACOBI, GAUSS_SEIDEL, CG),
+            CACHE_MODE: (WRITE_BACK, WRITE_THROUGH),
+            PRECISION: (DOUBLE, SINGLE)}
         
         # the seed will be set when loading a test file
         self.rand_gen = random.Random() 
@@ -270,31 +448,89 @@ class TestGenerator:
             @type dim: integer
             @param dim: the dimension of the matrix
             @param seed: the seed for the pseudorandom generator
-            @return: a list of lists containing the matrix
+            @return: a Matrix containing the matrix
         """
-        matrix = []
+        data = array("d")
         for i in range(dim):
-            matrix.append([self.rand_gen.uniform(-1000,1000) for i in range(dim)])
+            data.extend([self.rand_gen.uniform(-1000,1000) for i in range(dim)])
         
-        return matrix
+        return Matrix(dim, data)
+
+    def generate_sparse_matrix(self, dim, density):
+        """
+            Randomly generates a sparse square matrix. The diagonal elements
+            are nonzero; each row has round(density * (dim - 1)) other
+            nonzero elements, in random columns.
+            @type dim: integer
+            @param dim: the dimension of the matrix
+            @type density: float
+            @param density: the fraction of nonzero elements, between 0 and 1
+            @return: a SparseMatrix containing the matrix
+        """
+        count = int(round(density * (dim - 1)))
+        rows = []
+        for i in range(dim):
+            others = self.rand_gen.sample(xrange(dim - 1), count)
+            indices = sorted([i] + [j + (j >= i) for j in others])
+            values = [self.rand_gen.uniform(-1000,1000) for j in indices]
+            rows.append(SparseRow(dim, indices, values))
+
+        return SparseMatrix(dim, rows)
+
+    def generate_band_matrix(self, dim, band, symmetric = False):
+        """
+            Randomly generates a diagonally dominant band matrix, like the
+            ones of discretized differential equations.
+            @type dim: integer
+            @param dim: the dimension of the matrix
+            @type band: integer
+            @param band: the number of nonzero diagonals on each side of the
+                main one; 1 for a tridiagonal matrix
+            @type symmetric: boolean
+            @param symmetric: True for a symmetric matrix with a positive
+                diagonal, which is then positive definite
+            @return: a SparseMatrix containing the matrix
+        """
+        rows = []
+        for i in range(dim):
+            indices = range(max(i - band, 0), min(i + band + 1, dim))
+            values = [self.rand_gen.uniform(-1000,1000) for j in indices]
+            sign = self.rand_gen.choice((-1, 1))
+            if symmetric:
+                sign = 1
+                for p in range(len(indices)):
+                    if indices[p] < i:
+                        values[p] = rows[indices[p]][i]
+            diagonal = indices.index(i)
+            values[diagonal] = sign * \
+                (sum([abs(value) for value in values]) +
+                self.rand_gen.uniform(1,1000))
+            rows.append(SparseRow(dim, indices, values))
+
+        return SparseMatrix(dim, rows)
        
-    def generate_vectors(self, matrix):
+    def generate_vectors(self, matrix, rhs = 1):
         """
             Generate the X and B vectors of A*X=B equation. X is randomly 
             generated and than B is the result of A*X.
+            @type rhs: integer
+            @param rhs: the number of right-hand sides; with more than one,
+                the elements of X and B are Vectors of one element per
+                right-hand side
             @return 
         """
         dim = len(matrix)
-        x = [self.rand_gen.uniform(-1000,1000) for i in range(dim)]
-
-        b = []
+        xs = []
+        for k in range(max(rhs, 1)):
+            xs.append(array("d",
+                [self.rand_gen.uniform(-1000,1000) for i in range(dim)]))
 
-        for i in range(dim):
-            b.append(0)
-            for j in range(dim):
-                b[i] += matrix[i][j] * x[j]
+        bs = [matrix.multiply(x) for x in xs]
 
-        return (x, b)
+        if rhs <= 1:
+            return (xs[0], bs[0])
+        return ([Vector([x[i] for x in xs]) for i in range(dim)],
+            [Vector([b[i] for b in bs]) for i in range(dim)])
               
 
     def load_matrix(self, filename, mat_size):
@@ -306,8 +542,10 @@ class TestGenerator:
             @param filename: the file containing the matrix
             @type mat_size: integer
             @param mat_size: the expected size for the matrix
+            @return: a Matrix containing the matrix
         """
-        mat = []
+        data = array("d")
+        rows = 0
         try:
             f = open(filename, "r")
             for line in f:
@@ -315,13 +553,15 @@ class TestGenerator:
                 if len(line) == 0 or line.startswith('#'):
                     continue
                 parts = line.split()
-                mat.append([float(x) for x in parts])
+                data.extend([float(x) for x in parts])
+                rows += 1
 
-            if mat_size != len(mat):
+            if mat_size != rows:
                 print "Incorrect size %d for given matrix, expected %d " %\
-                                                        (len(mat), mat_size)
+                                                        (rows, mat_size)
                 os._exit(0)
 
+            mat = Matrix(mat_size, data)
         except Exception, err: #IOError or cast errors
             print err
             os._exit(0)
@@ -350,7 +590,9 @@ class TestGenerator:
                 if parts[0] not in test_params:
                     raise Exception("Wrong parameter name: %s" % parts[0])
 
-                if parts[0] != TEST_NAME and parts[0] != MAT_FILE:
+                if parts[0] not in (TEST_NAME, MAT_FILE, LATENCY_MODEL,
+                                    ADMISSION, CACHE_MODE, PRECISION,
+                                    SOLVER):
                     if parts[1].isdigit():
                         test_params[parts[0]] = int(parts[1])
                     else:
@@ -360,6 +602,10 @@ class TestGenerator:
                             raise Exception("Wrong parameter %s type, expected \
 int or float, not %s" % (parts[0], type(parts[1])))
                 else:
+                    values = self.params_values.get(parts[0])
+                    if values is not None and parts[1] not in values:
+                        raise Exception("Wrong parameter %s value, expected \
+one of %s, not %s" % (parts[0], ", ".join(values), parts[1]))
                     test_params[parts[0]] = parts[1]
 
                 
@@ -377,13 +623,28 @@ int or float, not %s" % (parts[0], type(parts[1])))
         # set seed of the Random object used to generate the matrix and vector
         self.rand_gen.seed(test_params[SEED_MAT])
                
-        if test_params[MAT_FILE] == 0:
+        if test_params[MAT_FILE] == 0 and test_params[BAND] > 0:
+            test_params[A] = self.generate_band_matrix(test_params[MAT_SIZE],
+                test_params[BAND], test_params[SYMMETRIC])
+        elif test_params[MAT_FILE] == 0 and 0 < test_params[DENSITY] < 1:
+            test_params[A] = self.generate_sparse_matrix(test_params[MAT_SIZE],
+                test_params[DENSITY])
+        elif test_params[MAT_FILE] == 0:
             test_params[A] = self.generate_matrix(test_params[MAT_SIZE])
         else:
             test_params[A] = self.load_matrix(test_params[MAT_FILE],
                 test_params[MAT_SIZE])
 
-        test_params[X], test_params[B] = self.generate_vectors(test_params[A])
+        test_params[X], test_params[B] = self.generate_vectors(test_params[A],
+            test_params[RHS])
+        test_params[STREAM] = [self.generate_vectors(test_params[A],
+            test_params[RHS]) for k in range(test_params[RESOLVES])]
+
+        # the same datastores are slow in every iteration of the test
+        rand_gen = random.Random(test_params[SEED_DS])
+        test_params[STRAGGLERS] = frozenset(i
+            for i in range(test_params[MAT_SIZE])
+            if rand_gen.random() < test_params[STRAGGLER_FRACTION])
 
         return test_params       
             
@@ -414,6 +675,16 @@ int or float, not %s" % (parts[0], type(parts[1])))
 
         return test_params
 
+
+def rounded(x):
+    """
+        Rounds an element of x to its 3rd decimal, or all the elements of a
+        Vector or list of the x values of several right-hand sides.
+    """
+    if hasattr(x, "__len__"):
+        return [round(value, 3) for value in x]
+    return round(x, 3)
+
         
 def usage(argv):
     print "Usage: python %s [OPTIONS]"%argv[0]
@@ -421,12 +692,13 @@ def usage(argv):
     print "\t-f,   --testfile\ttest file, if not specified it generates a random test"
     print "\t-o,   --out\t\toutput file"
     print "\t-t,   --times\t\tthe number of times the test is run, defaults to 2"
+    print "\t-s,   --stats\t\tdatastore statistics file, '-' for stdout"
     print "\t-h,   --help\t\tprint this help screen"
 
 if __name__ == "__main__":
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "h:f:o:t:", ["help",
-            "testfile=", "out=", "times="])
+        opts, args = getopt.getopt(sys.argv[1:], "h:f:o:t:s:", ["help",
+            "testfile=", "out=", "times=", "stats="])
     except getopt.GetoptError, err:
         print str(err)
         usage(sys.argv)
@@ -435,6 +707,7 @@ if __name__ == "__main__":
     test_file = ""
     times = 2
     output_file = "tester.out"
+    stats_file = None
 
     for o, a in opts:
         if o in ("-h", "--help"):
@@ -444,6 +717,8 @@ if __name__ == "__main__":
             test_file = a
         elif o in ("-o", "--out"):
             output_file = a 
+        elif o in ("-s", "--stats"):
+            stats_file = a
         elif o in ("-t", "--times"):
             try:
                 times = int(a)
@@ -454,5 +729,5 @@ if __name__ == "__main__":
             assert False, "unhandled option"
     
     res =  TestGenerator().load_test(test_file)
-    t = Tester(output_file)
+    t = Tester(output_file, stats_file)
     t.run_test(test_file, times)
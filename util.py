@@ -1,3 +1,6 @@
+import math
+
+
 # Test parameters, the same string as in the test file format
 NUM_NODES = "num_nodes" 
 MAT_SIZE = "mat_size" 
@@ -12,6 +15,44 @@ SEED_MAT = "seed_elem"
 MIN_DATASTORE_DELAY = "min_datastore_delay"
 MAX_DATASTORE_DELAY = "max_datastore_delay"
 MAX_PENDING_REQUESTS = "max_pending_requests"
+TRANSFER_DATASTORE_DELAY = "transfer_datastore_delay"
+VIRTUAL_TIME = "virtual_time"
+LATENCY_MODEL = "latency_model"
+LATENCY_SIGMA = "latency_sigma"
+STRAGGLER_FRACTION = "straggler_fraction"
+STRAGGLER_SLOWDOWN = "straggler_slowdown"
+ADMISSION = "admission"
+DENSITY = "density"
+BAND = "band"
+SYMMETRIC = "symmetric"
+RHS = "rhs"
+RESOLVES = "resolves"
+
+# Node parameters, passed by the tester to the nodes
+CACHE_MODE = "cache_mode"
+PANEL_WIDTH = "panel_width"
+LOOKAHEAD = "lookahead"
+ADAPTIVE_WINDOW = "adaptive_window"
+PRECISION = "precision"
+REFINEMENT_STEPS = "refinement_steps"
+SPARSE = "sparse"
+BANDED = "banded"
+BANDWIDTH = "bandwidth"
+SOLVER = "solver"
+MAX_ITERATIONS = "max_iterations"
+
+# Values of the node parameters
+WRITE_BACK = "write_back"
+WRITE_THROUGH = "write_through"
+DOUBLE = "double"
+SINGLE = "single"
+JACOBI = "jacobi"
+GAUSS_SEIDEL = "gauss_seidel"
+CG = "cg"
+
+NODE_PARAMS = [CACHE_MODE, PANEL_WIDTH, LOOKAHEAD, ADAPTIVE_WINDOW,
+    PRECISION, REFINEMENT_STEPS, SPARSE, BANDED, BANDWIDTH, SOLVER,
+    MAX_ITERATIONS]
 
 BONUS = "bonus"
 
@@ -19,6 +60,10 @@ BONUS = "bonus"
 A = "A"
 X = "X"
 B = "B"
+# the (X, B) pairs solved again against the same A, after the first solve
+STREAM = "STREAM"
+# the indices of the datastores slowed down by 'straggler_slowdown'
+STRAGGLERS = "STRAGGLERS"
 
 
 # Tester messages
@@ -29,6 +74,25 @@ test_errors_msg     = "Errors in iteration %d of %d:"
 test_finished_msg   = "Test %-10s Finished...............%d%% completed"
 test_bonus_msg      = " + %d%% bonus"
 timout_msg          = "Test %-10s Timeout................%d%% completed"
+test_time_msg       = "Test %-10s wall time %.3fs"
+test_makespan_msg   = ", simulated makespan %.3fs"
+test_resolve_msg    = ", %d re-solves in %.3fs (%.1f per second)"
+
+
+def percentile(values, p):
+    """
+        Returns the p-th percentile (nearest rank) of a sorted list of values.
+
+        @type values: List of Float
+        @param values: the sorted values
+        @type p: Float
+        @param p: the percentile, between 0 and 100
+        @return: the percentile, 0 if there are no values
+    """
+    if len(values) == 0:
+        return 0
+    rank = int(math.ceil(p / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
 
 
 def mprint(matrix):